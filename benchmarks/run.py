@@ -0,0 +1,300 @@
+"""
+Benchmarks for django-modelqueryform
+
+Builds synthetic `BaseModelForTest`/`RelatedModelForTest` datasets in SQLite and measures wall time,
+query count and peak memory (tracemalloc) of the form operations. Results are written as JSON so runs
+of different commits can be compared::
+
+    $ python benchmarks/run.py --rows 1000 10000 100000 1000000 --output before.json
+    $ git checkout my-branch
+    $ python benchmarks/run.py --rows 1000 10000 100000 1000000 --output after.json --compare before.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#: Version of the JSON layout written by this script
+RESULTS_VERSION = 1
+
+#: Operations measured for every dataset and form, in order
+OPERATIONS = ['init', 'is_valid', 'get_filters', 'process', 'pretty_print_query', 'query_hash']
+
+
+def setup_django(database):
+    import django
+    from django.conf import settings
+
+    if not settings.configured:
+        settings.configure(
+            DEBUG=False,
+            USE_TZ=True,
+            DATABASES={
+                "default": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": database,
+                }
+            },
+            INSTALLED_APPS=[
+                "django.contrib.auth",
+                "django.contrib.contenttypes",
+                "django.contrib.sites",
+                "modelqueryform",
+                "tests",
+            ],
+            SITE_ID=1,
+        )
+    django.setup()
+
+
+def create_dataset(rows, seed=0, batch_size=500):
+    """
+    (Re)create the test tables with `rows` BaseModelForTest rows and rows // 10 (at least 10) related rows
+
+    Every base row has a foreign key, 0-3 many to many relations and, for the first related rows,
+    a one to one relation
+    """
+    from django.core.management import call_command
+    from django.db import connection
+    from tests.models import BaseModelForTest, RelatedModelForTest
+
+    with connection.schema_editor() as editor:
+        # Dropping BaseModelForTest drops its many to many table too
+        for model in (BaseModelForTest, RelatedModelForTest):
+            if model._meta.db_table in connection.introspection.table_names():
+                editor.delete_model(model)
+    call_command('migrate', run_syncdb=True, verbosity=0)
+
+    rng = random.Random(seed)
+    related_count = max(10, rows // 10)
+    RelatedModelForTest.objects.bulk_create(
+        [RelatedModelForTest(related_type=rng.randint(1, 50)) for _ in range(related_count)],
+        batch_size=batch_size
+    )
+    related_pks = list(RelatedModelForTest.objects.values_list('pk', flat=True))
+
+    through = BaseModelForTest.many_related.through
+    for start in range(0, rows, batch_size):
+        bases = []
+        for index in range(start, min(rows, start + batch_size)):
+            bases.append(BaseModelForTest(
+                integer=rng.randint(0, 1000),
+                integer_with_choices=rng.choice([1, 2, 3]),
+                float=rng.uniform(0, 1000),
+                boolean=rng.random() < 0.5,
+                null_boolean=rng.choice([True, False, None]),
+                text="row %s" % index,
+                related_type_id=related_pks[index] if index < len(related_pks) else None,
+                foreign_related_id=rng.choice(related_pks),
+            ))
+        BaseModelForTest.objects.bulk_create(bases, batch_size=batch_size)
+
+    links = []
+    for base_pk in BaseModelForTest.objects.values_list('pk', flat=True).iterator():
+        for related_pk in rng.sample(related_pks, rng.randint(0, 3)):
+            links.append(through(basemodelfortest_id=base_pk, relatedmodelfortest_id=related_pk))
+        if len(links) >= batch_size:
+            through.objects.bulk_create(links, batch_size=batch_size)
+            links = []
+    through.objects.bulk_create(links, batch_size=batch_size)
+
+
+def get_benchmark_forms():
+    """
+    :returns list: [(name, form class, POST data),...]
+    """
+    from tests.forms import FormTest, GoodTraverseForm
+
+    return [
+        ('FormTest', FormTest, {
+            'integer_0': 100, 'integer_1': 600,
+            'float_0': 0, 'float_1': 900,
+            'integer_with_choices': ['1', '2'],
+            'boolean': ['True'],
+            'null_boolean': ['True', 'None'],
+        }),
+        ('GoodTraverseForm', GoodTraverseForm, {
+            'integer_0': 100, 'integer_1': 600,
+            'foreign_related__related_type_0': 5, 'foreign_related__related_type_1': 30,
+            'many_related__related_type_0': 10, 'many_related__related_type_1': 20,
+        }),
+    ]
+
+
+def get_operations(form_class, data):
+    """
+    :returns dict: {operation: (setup, run),...} `run(setup())` is measured, the setup isn't
+    """
+    def validated():
+        form = form_class(data)
+        form.is_valid()
+        return form
+
+    return {
+        'init': (lambda: None, lambda _: form_class(data)),
+        'is_valid': (lambda: form_class(data), lambda form: form.is_valid()),
+        'get_filters': (validated, lambda form: form.get_filters()),
+        'process': (validated, lambda form: len(list(form.process()))),
+        'pretty_print_query': (validated, lambda form: form.pretty_print_query()),
+        'query_hash': (validated, lambda form: form.query_hash()),
+    }
+
+
+def measure(setup, run, repeat):
+    """
+    Time `run(setup())` `repeat` times, then count its queries and peak allocated memory in one more run
+
+    Memory is traced in its own run so tracemalloc's overhead stays out of the timings
+
+    :returns dict: {'wall_time': {'min', 'median', 'max'}, 'queries', 'peak_memory'}
+    """
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        timings.append(time.perf_counter() - start)
+
+    arg = setup()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            run(arg)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'wall_time': {
+            'min': min(timings),
+            'median': statistics.median(timings),
+            'max': max(timings),
+        },
+        'queries': len(queries),
+        'peak_memory': peak_memory,
+    }
+
+
+def get_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(row_counts, repeat, seed, operations=None):
+    """
+    :returns dict: JSON serializable results
+    """
+    import django
+
+    results = []
+    for rows in row_counts:
+        started = time.perf_counter()
+        create_dataset(rows, seed)
+        print("%s rows created in %.1fs" % (rows, time.perf_counter() - started), file=sys.stderr)
+
+        for form_name, form_class, data in get_benchmark_forms():
+            for operation, (setup, run) in get_operations(form_class, data).items():
+                if operations and operation not in operations:
+                    continue
+                result = measure(setup, run, repeat)
+                result.update({'rows': rows, 'form': form_name, 'operation': operation})
+                results.append(result)
+                print("%8s %-18s %-20s %10.6fs %4s queries %10s bytes"
+                      % (rows, form_name, operation, result['wall_time']['median'], result['queries'],
+                         result['peak_memory']),
+                      file=sys.stderr)
+
+    return {
+        'version': RESULTS_VERSION,
+        'meta': {
+            'commit': get_commit(),
+            'created': datetime.datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+    Compare the fastest wall time, query count and peak memory of two result files
+
+    :param float threshold: Relative increase reported as a regression, eg. 0.2 for 20%
+    :returns list: Descriptions of the regressions
+    """
+    def key(result):
+        return result['rows'], result['form'], result['operation']
+
+    old_results = dict((key(result), result) for result in baseline['results'])
+    regressions = []
+    for result in current['results']:
+        old = old_results.get(key(result))
+        if old is None:
+            continue
+        for metric, old_value, value in (
+                ('wall_time', old['wall_time']['min'], result['wall_time']['min']),
+                ('queries', old['queries'], result['queries']),
+                ('peak_memory', old['peak_memory'], result['peak_memory'])):
+            if value > old_value * (1 + threshold) and value != old_value:
+                regressions.append("%s %s %s: %s %s -> %s" % (key(result) + (metric, old_value, value)))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="Dataset sizes to benchmark (default: 1000 10000 100000)")
+    parser.add_argument('--repeat', type=int, default=5, help="Timed runs per operation (default: 5)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic data (default: 0)")
+    parser.add_argument('--operation', action='append', choices=OPERATIONS,
+                        help="Only run this operation, can be repeated")
+    parser.add_argument('--database', default=':memory:',
+                        help="SQLite database file, in memory by default. It is overwritten")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+    parser.add_argument('--compare', help="JSON results of an earlier run to check for regressions")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Relative increase --compare reports as a regression (default: 0.2)")
+    args = parser.parse_args(argv)
+
+    setup_django(args.database)
+    results = run_benchmarks(args.rows, args.repeat, args.seed, args.operation)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+    else:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(json.load(baseline_file), results, args.threshold)
+        for regression in regressions:
+            print("REGRESSION %s" % regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1 +1,3 @@
 __version__ = "3.0"
+
+default_app_config = 'modelqueryform.apps.ModelQueryFormConfig'
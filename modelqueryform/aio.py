@@ -0,0 +1,90 @@
+"""
+Async API of ModelQueryForm
+
+.. note:: This module needs Python 3.6+ and asgiref, import it only from async code
+"""
+from itertools import islice
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .utils import iterate_in_chunks
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    sync_to_async = None
+
+
+class AsyncModelQueryFormMixin(object):
+    """
+    Add awaitable counterparts of the ModelQueryForm methods that query the database::
+
+        class MyModelQueryForm(AsyncModelQueryFormMixin, ModelQueryForm):
+            model = MyModel
+
+    The supported Django versions have no async ORM so the queries run in a sync thread with asgiref.
+    """
+
+    @classmethod
+    async def acreate(cls, *args, **kwargs):
+        """
+        Instantiate the form and :meth:`abuild` it
+
+        :returns ModelQueryForm: The built form
+        """
+        kwargs['defer_build'] = True
+        form = cls(*args, **kwargs)
+        await form.abuild()
+        return form
+
+    async def abuild(self):
+        """
+        Async counterpart of `build()`
+        """
+        await self._sync_to_async(self.build)()
+
+    async def aprocess(self, data_set=None, load_related=False):
+        """Async counterpart of `process()`
+
+        .. note:: `process()` only queries the database for `explain_queries`, which runs in a sync thread
+
+        :returns QuerySet: The (lazy) filtered QuerySet
+        """
+        if self.explain_queries:
+            return await self._sync_to_async(self.process)(data_set, load_related)
+        return self.process(data_set, load_related)
+
+    async def acount(self, data_set=None):
+        """
+        Count the rows matched by :meth:`aprocess`
+
+        :returns int:
+        """
+        queryset = await self.aprocess(data_set)
+        return await self._sync_to_async(queryset.count)()
+
+    async def aiter(self, data_set=None, chunk_size=2000):
+        """
+        Asynchronously iterate the rows matched by :meth:`aprocess`, `chunk_size` rows at a time
+
+        :returns: async iterator of model instances
+        """
+        queryset = await self.aprocess(data_set)
+        rows = iterate_in_chunks(queryset, chunk_size)
+        next_chunk = self._sync_to_async(lambda: list(islice(rows, chunk_size)))
+        while True:
+            chunk = await next_chunk()
+            if not chunk:
+                return
+            for row in chunk:
+                yield row
+
+    def _sync_to_async(self, func):
+        """
+        Wrap a sync callable to be awaited from the async API
+
+        :raises ImproperlyConfigured: If asgiref is missing
+        """
+        if sync_to_async is None:
+            raise ImproperlyConfigured("The async ModelQueryForm API needs asgiref")
+        return sync_to_async(func, thread_sensitive=True)
@@ -0,0 +1,32 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_started
+from django.utils.module_loading import autodiscover_modules
+
+
+class ModelQueryFormConfig(AppConfig):
+    """
+    Warms up the forms with `warm_up` set in a daemon thread started by the first request when
+    `settings.MODELQUERYFORM_WARM_UP` is 'background'
+
+    Nothing is queried while the app loads, so management commands never warm up. Warming up before serving
+    (blocking) is left to the `warm_up_forms` command. The forms module of every
+    installed app is imported so the `cache` and `result_cache` of every form invalidate from the start.
+    """
+    name = 'modelqueryform'
+    verbose_name = "Model Query Form"
+
+    def ready(self):
+        from .forms import form_registry
+        autodiscover_modules('forms')
+        for form_class in list(form_registry.values()):
+            form_class.watch_caches()
+
+        warm_up = getattr(settings, 'MODELQUERYFORM_WARM_UP', False)
+        if warm_up == 'background':
+            from .warmup import warm_up_on_first_request
+            request_started.connect(warm_up_on_first_request, dispatch_uid='modelqueryform-warm-up')
+        elif warm_up:
+            raise ImproperlyConfigured("MODELQUERYFORM_WARM_UP can only be 'background', "
+                                       "run the warm_up_forms command to warm up before serving")
@@ -0,0 +1,218 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+
+class LRUCache(object):
+    """
+    Thread safe in-process least recently used cache
+
+    :ivar int maxsize: Maximum number of entries kept
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FormCache(object):
+    """
+    Layered cache for data that ModelQueryForm derives from the database (range bounds, choice lists)
+
+    Lookups go to an in-process `LRUCache` first and then to an optional django cache backend that is
+    shared by every worker. Every entry is keyed by the data version of the models it was computed from.
+    Versions are bumped by `post_save`, `post_delete` and `m2m_changed` for those models so a write
+    makes the old entries unreachable.
+
+    .. note::
+        Signals only fire in the process that did the write. Without a `backend` other processes
+        keep serving their local entry until `ttl` runs out.
+
+    :ivar int ttl: Seconds an entry is fresh
+    :ivar int stale_ttl: Seconds past `ttl` an entry is still served while it is refreshed in a background thread
+    :ivar backend: Alias of a django cache (see `settings.CACHES`) or a cache object, or None for in-process only
+    """
+
+    def __init__(self, maxsize=256, ttl=300, stale_ttl=0, backend=None, key_prefix='modelqueryform'):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.key_prefix = key_prefix
+        self._backend = backend
+        self._local = LRUCache(maxsize)
+        self._versions = {}
+        self._epoch = self._initial_version()
+        self._watched = set()
+        self._refreshing = {}
+        self._lock = threading.Lock()
+
+    @property
+    def backend(self):
+        if isinstance(self._backend, str):
+            from django.core.cache import caches
+            self._backend = caches[self._backend]
+        return self._backend
+
+    def get_or_set(self, key, models, compute):
+        """
+        Get a cached value, calling `compute()` to fill the cache on a miss
+
+        :param key: Hashable, repr() stable key for the value
+        :param models: Models whose data the value is computed from
+        :type models: iterable
+        :param compute: Callable returning the value
+        :returns: The cached or computed value
+        """
+        self.watch(models)
+        full_key = self._make_key(key, models)
+
+        entry = self._local.get(full_key)
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(full_key)
+            if entry is not None:
+                self._local.set(full_key, entry)
+
+        if entry is not None:
+            value, expires = entry
+            now = time.time()
+            if now < expires:
+                return value
+            if now < expires + self.stale_ttl:
+                self._revalidate(full_key, compute)
+                return value
+
+        return self._compute(full_key, compute)
+
+    def watch(self, models):
+        """
+        Connect the invalidation signals for `models`
+
+        :param models: Models whose writes should invalidate entries
+        :type models: iterable
+        """
+        for model in models:
+            if model in self._watched:
+                continue
+            self._watched.add(model)
+            uid = "%s:%s:%s" % (self.key_prefix, id(self), model._meta.label)
+            post_save.connect(self._invalidate_receiver, sender=model, dispatch_uid=uid)
+            post_delete.connect(self._invalidate_receiver, sender=model, dispatch_uid=uid)
+            m2m_changed.connect(self._invalidate_receiver, sender=model, dispatch_uid=uid)
+
+    def invalidate(self, model):
+        """
+        Bump the data version of `model`, making every entry computed from it unreachable
+
+        :param model: Model whose data changed
+        :type model: django.db.models.Model
+        """
+        label = model._meta.label
+        with self._lock:
+            self._versions[label] = self._versions.get(label, self._epoch) + 1
+        if self.backend is not None:
+            version_key = self._version_key(label)
+            try:
+                self.backend.incr(version_key)
+            except ValueError:
+                self.backend.set(version_key, self._initial_version(), None)
+
+    def get_versions(self, models):
+        """
+        Get the current data version of each model
+
+        :param models: Models to get versions for
+        :type models: iterable
+        :returns list: [(model label, version),...] sorted by label
+        """
+        labels = sorted(set(model._meta.label for model in models))
+        if self.backend is None:
+            return [(label, self._versions.get(label, self._epoch)) for label in labels]
+
+        keys = dict((self._version_key(label), label) for label in labels)
+        found = self.backend.get_many(list(keys))
+        versions = []
+        for version_key, label in sorted(keys.items(), key=lambda item: item[1]):
+            version = found.get(version_key)
+            if version is None:
+                self.backend.add(version_key, self._initial_version(), None)
+                version = self.backend.get(version_key)
+            versions.append((label, version))
+        return versions
+
+    def clear(self):
+        """
+        Drop every in-process entry
+
+        .. note:: Entries in `backend` are left to expire
+        """
+        self._local.clear()
+
+    def _invalidate_receiver(self, sender, **kwargs):
+        if kwargs.get('action', 'post_').startswith('post_'):
+            self.invalidate(sender)
+
+    def _make_key(self, key, models):
+        raw = "%r:%r" % (key, self.get_versions(models))
+        return "%s:%s" % (self.key_prefix, hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    def _version_key(self, label):
+        return "%s:version:%s" % (self.key_prefix, label)
+
+    def _initial_version(self):
+        return int(time.time() * 1000)
+
+    def _compute(self, full_key, compute):
+        value = compute()
+        entry = (value, time.time() + self.ttl)
+        self._local.set(full_key, entry)
+        if self.backend is not None:
+            self.backend.set(full_key, entry, self.ttl + self.stale_ttl)
+        return value
+
+    def _revalidate(self, full_key, compute):
+        with self._lock:
+            if full_key in self._refreshing:
+                return
+            thread = threading.Thread(target=self._refresh, args=(full_key, compute))
+            thread.daemon = True
+            self._refreshing[full_key] = thread
+        thread.start()
+
+    def _refresh(self, full_key, compute):
+        try:
+            self._compute(full_key, compute)
+        finally:
+            with self._lock:
+                self._refreshing.pop(full_key, None)
+            connections.close_all()
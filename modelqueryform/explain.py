@@ -0,0 +1,110 @@
+import json
+import re
+from collections import namedtuple
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+QueryPlan = namedtuple('QueryPlan', ['plan', 'cost', 'full_scans'])
+QueryPlan.__doc__ = """
+Backend query plan with a parsed summary
+
+:ivar plan: The plan as returned by the backend (rows for SQLite, parsed JSON for PostgreSQL and MySQL)
+:ivar float cost: Estimated total cost, None when the backend doesn't report one (SQLite)
+:ivar list full_scans: Tables read with a full table scan
+"""
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?')
+
+
+class QueryTooExpensive(ValueError):
+    """
+    Raised when a query plan goes over `ModelQueryForm.max_query_cost` or does a disallowed full table scan
+
+    :ivar QueryPlan plan: The rejected plan
+    """
+
+    def __init__(self, message, plan):
+        super(QueryTooExpensive, self).__init__(message)
+        self.plan = plan
+
+
+def explain_queryset(queryset):
+    """Run the backend's EXPLAIN for a QuerySet without evaluating it
+
+    :param queryset: QuerySet to explain
+    :type queryset: django.db.models.QuerySet
+    :returns: `QueryPlan`, an empty plan with a cost of 0 for QuerySets that can't match a row (eg. `none()`)
+    :raises NotImplementedError: For database backends other than SQLite, PostgreSQL and MySQL
+    """
+    connection = connections[queryset.db]
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:  # Never sent to the database
+        return QueryPlan([], 0, [])
+
+    if connection.vendor == 'sqlite':
+        rows = _run(connection, 'EXPLAIN QUERY PLAN ' + sql, params)
+        return _parse_sqlite(rows)
+    if connection.vendor == 'postgresql':
+        rows = _run(connection, 'EXPLAIN (FORMAT JSON) ' + sql, params)
+        return _parse_postgresql(_load_json(rows[0][0]))
+    if connection.vendor == 'mysql':
+        rows = _run(connection, 'EXPLAIN FORMAT=JSON ' + sql, params)
+        return _parse_mysql(_load_json(rows[0][0]))
+
+    raise NotImplementedError("Query plans are not supported for the %s backend" % connection.vendor)
+
+
+def _run(connection, sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _load_json(value):
+    if isinstance(value, (str, bytes)):
+        return json.loads(value)
+    return value
+
+
+def _parse_sqlite(rows):
+    full_scans = []
+    for row in rows:
+        detail = row[-1]
+        match = _SQLITE_SCAN.match(detail)
+        if match and ' USING ' not in detail and match.group(1) not in ('CONSTANT', 'SUBQUERY'):
+            full_scans.append(match.group(1))
+    return QueryPlan(rows, None, full_scans)
+
+
+def _parse_postgresql(plan):
+    full_scans = []
+
+    def walk(node):
+        if node.get('Node Type') == 'Seq Scan':
+            full_scans.append(node.get('Relation Name'))
+        for child in node.get('Plans', []):
+            walk(child)
+
+    root = plan[0]['Plan']
+    walk(root)
+    return QueryPlan(plan, float(root['Total Cost']), full_scans)
+
+
+def _parse_mysql(plan):
+    full_scans = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL':
+                full_scans.append(node.get('table_name'))
+            for child in node.values():
+                walk(child)
+        elif isinstance(node, list):
+            for child in node:
+                walk(child)
+
+    walk(plan)
+    cost = plan.get('query_block', {}).get('cost_info', {}).get('query_cost')
+    return QueryPlan(plan, float(cost) if cost is not None else None, full_scans)
@@ -1,38 +1,311 @@
 
+import base64
+import binascii
+import copy
+import csv
 import hashlib
-import operator
-from collections import OrderedDict
-from functools import reduce
+import json
+from collections import OrderedDict, namedtuple
 
-from django.core.exceptions import ImproperlyConfigured, FieldDoesNotExist
+from django.apps import apps
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured, FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, Count, F, Manager, Prefetch, When
 from django.db.models.query_utils import Q
 from django.forms import Form, MultipleChoiceField
+from django.forms.forms import DeclarativeFieldsMetaclass
+from django.forms.widgets import MultiWidget
+from django.urls import reverse_lazy
 
 from .utils import traverse_related_to_field, get_range_field, \
     get_range_field_filter, get_multiplechoice_field, \
-    get_multiplechoice_field_filter
-from .widgets import RangeField
+    get_multiplechoice_field_filter, get_range_bounds, get_path_models, \
+    get_choices_from_values, get_choices_from_distinct, flatten_q, iterate_in_chunks, \
+    compile_path, canonical_value, path_is_to_many, estimate_cardinality
+from .explain import explain_queryset, QueryTooExpensive
+from . import instrumentation
+from .widgets import RangeField, AutocompleteField
 
+#: Bumped when the input to :meth:`ModelQueryForm.query_fingerprint` changes, so old fingerprints never match
+FINGERPRINT_VERSION = 1
 
-class ModelQueryForm(Form):
+#: Version of the :meth:`ModelQueryForm.encode_query` format, strings with another version are rejected
+QUERY_CODEC_VERSION = 1
+
+#: {"module.FormName": form class,...} of every ModelQueryForm subclass with a `model`
+form_registry = {}
+
+FieldSpec = namedtuple('FieldSpec', ['name', 'model_field', 'builder', 'prototype', 'hops'])
+FieldSpec.__doc__ = """
+Compiled description of a single `include` entry
+
+:ivar str name: Form field name (the value from `include`)
+:ivar model_field: Terminal model field the form field filters
+:ivar tuple hops: The compiled path, see :func:`modelqueryform.utils.compile_path`
+:ivar str builder: Name of the form method that builds the form field
+:ivar prototype: Prebuilt form field for builders that do not depend on the data, else None
+"""
+
+FieldHooks = namedtuple('FieldHooks', ['model_field', 'filter', 'print_field', 'print_type'])
+FieldHooks.__doc__ = """
+Customization hooks found for a form field name
+
+:ivar model_field: Terminal model field of the form field name
+:ivar str filter: Name of the `filter_FIELD` or `filter_type_FIELD` method, None for the default filters
+:ivar str print_field: Name of the `print_FIELD` method or None
+:ivar str print_type: Name of the `print_type_FIELD` method or None
+"""
+
+
+class _LineBuffer(object):
+    """
+    File-like object for `csv.writer` that hands back each written line instead of storing it
+    """
+    def write(self, value):
+        return value
+
+
+class ModelQueryFormMetaclass(DeclarativeFieldsMetaclass):
+    """
+    Give every ModelQueryForm subclass its own (empty) compiled field spec and hook caches,
+    validate its `include` paths and add it to `form_registry`
+
+    :raises ImproperlyConfigured: If a name in `include` can't be resolved against `model`
+        or `widget_policy` is set without a `cache`
+    """
+    def __new__(mcs, name, bases, attrs):
+        attrs['_field_specs'] = None
+        attrs['_field_hooks'] = {}
+        new_class = super(ModelQueryFormMetaclass, mcs).__new__(mcs, name, bases, attrs)
+        if getattr(new_class, 'model', None) is not None:
+            if new_class.widget_policy and new_class.cache is None:
+                raise ImproperlyConfigured("%s.widget_policy needs a cache for its estimates" % name)
+            if apps.models_ready:
+                for path in new_class.include:
+                    try:
+                        compile_path(new_class.model, path)
+                    except FieldDoesNotExist as e:
+                        raise ImproperlyConfigured("%s.include has an invalid path %s: %s" % (name, path, e))
+            form_registry[new_class.get_form_key()] = new_class
+            if apps.models_ready:
+                new_class.watch_caches()
+        return new_class
+
+
+class ModelQueryForm(Form, metaclass=ModelQueryFormMetaclass):
     """
     ModelQueryForm builds a django form that allows complex filtering against a model.
 
     :ivar Model model: Model to be filtered
     :ivar list include: Field names to be included using the standard orm naming
+    :ivar FormCache cache: Optional `modelqueryform.cache.FormCache` for range bounds and related choices
+    :ivar FormCache result_cache: `modelqueryform.cache.FormCache` used by :meth:`process_cached`
+    :ivar dict display_fields: {relation path: [field names],...} relations `process(load_related=True)` loads
+        with the results (on top of the `include` paths), prefetched relations only load the listed fields
+    :ivar bool lightweight_related_choices: Build related choices with `values_list()` instead of model instances
+    :ivar dict related_choice_labels: {model field name: label field or expression,...} for lightweight related
+        choices, fields listed here are always lightweight. The label defaults to the pk
+    :ivar int related_choices_chunk_size: Rows fetched at a time for lightweight related choices
+    :ivar list autocomplete_fields: Relation names in `include` that get an `AutocompleteField` instead of
+        rendering every related row. Labels come from `related_choice_labels`
+    :ivar dict autocomplete_search_fields: {include name: [orm lookups],...} matched against the search text,
+        defaults to LABEL__icontains
+    :ivar bool explain_queries: Run EXPLAIN on the QuerySet built by `process()` and keep it in `self.query_plan`
+    :ivar float max_query_cost: Reject plans with a higher estimated cost (needs `explain_queries`)
+    :ivar bool allow_full_scans: Set to False to reject plans with a full table scan (needs `explain_queries`)
+    :ivar str query_guard_action: 'raise' a `QueryTooExpensive` for rejected plans or 'downgrade' them with
+        :meth:`downgrade_query`
+    :ivar int facet_chunk_size: Maximum number of counts computed per query by :meth:`facet_counts`
+    :ivar str to_many_filter: How filters on paths with a many valued hop are applied. 'join' filters the joined
+        rows (rows can repeat once per matching relation), 'semijoin' filters with a subquery
+        (see :meth:`semijoin_filter`) so every row is returned once
+    :ivar dict to_many_filters: {include name: 'join' or 'semijoin',...} overrides `to_many_filter` per field
+    :ivar bool use_summaries: Read range bounds (and the distinct values of `summary_distinct_fields`) from the
+        `modelqueryform.models.FieldSummary` table, see :mod:`modelqueryform.summary`. Paths without a summary
+        are still aggregated
+    :ivar list summary_distinct_fields: Names whose distinct values `refresh_summaries` stores,
+        read by :meth:`get_distinct_choices`
+    :ivar bool warm_up: Compile this form (and fill its `cache`) at startup, see :mod:`modelqueryform.warmup`
+    :ivar bool widget_policy: Pick checkboxes, an `AutocompleteField` or a `RangeField` from the number of values
+        a field has, see :meth:`_get_policy_builder`. The estimates are kept in `cache`, which is required
+    :ivar int max_checkbox_choices: Most choices `widget_policy` renders as checkboxes
     """
     model = None
     include = []
+    cache = None
+    result_cache = None
+    display_fields = {}
+    lightweight_related_choices = False
+    related_choice_labels = {}
+    related_choices_chunk_size = 2000
+    autocomplete_fields = []
+    autocomplete_search_fields = {}
+    explain_queries = False
+    max_query_cost = None
+    allow_full_scans = True
+    query_guard_action = 'raise'
+    facet_chunk_size = 500
+    to_many_filter = 'join'
+    to_many_filters = {}
+    use_summaries = False
+    summary_distinct_fields = []
+    warm_up = False
+    widget_policy = False
+    max_checkbox_choices = 50
+
+    #: Builders whose form fields only depend on the model definition, these are built once per class
+    static_builders = ('_build_choices_field', '_build_boolean_field', '_build_autocomplete_field')
 
     def __init__(self, *args, **kwargs):
         """
+        :param bool defer_build: Don't build the form fields, call :meth:`build` instead
         :raises ImproperlyConfigured: If `model` is missing
         """
+        defer_build = kwargs.pop('defer_build', False)
         super(ModelQueryForm, self).__init__(*args, **kwargs)
         if not self.model:
             raise ImproperlyConfigured("ModelQueryForm needs a model defined as a class attribute")
 
-        self._build_form(self.model)
+        if not defer_build:
+            self.build()
+
+    def build(self):
+        """
+        Build the form fields, done by `__init__` unless `defer_build` is set
+        """
+        with self.span('build'):
+            self._build_form(self.model)
+
+    @classmethod
+    def get_form_key(cls):
+        """
+        :returns str: "module.FormName", identifies the form in `form_registry`, autocomplete urls
+            and :meth:`query_fingerprint`
+        """
+        return "%s.%s" % (cls.__module__, cls.__name__)
+
+    @classmethod
+    def watch_caches(cls):
+        """
+        Connect the invalidation signals of `cache` and `result_cache` for every model the form reads,
+        so writes invalidate their entries even in processes that never build the form.
+        Done when the class is created (or, for forms created before the models are loaded, by the app config)
+        """
+        caches = [cache for cache in (cls.cache, cls.result_cache) if cache is not None]
+        if not caches:
+            return
+        models = set([cls.model])
+        for path in cls.include:
+            models.update(get_path_models(path, cls.model))
+            related_model = compile_path(cls.model, path)[-1].field.related_model
+            if related_model is not None:
+                models.add(related_model)
+        for cache in caches:
+            cache.watch(models)
+
+    @classmethod
+    def get_autocomplete_queryset(cls, model_field, name):
+        """
+        Get the related rows an autocomplete field accepts. The submitted pks are validated against it and
+        :class:`modelqueryform.views.AutocompleteView` pages through it, override it to restrict both
+
+        .. note:: Autocomplete fields are built once per class, so the restriction can't depend on the instance
+
+        :param model_field: Relation of the field
+        :param name: Field name in `include`
+        :returns QuerySet: Defaults to every related row
+        """
+        return model_field.related_model.objects.all()
+
+    def _get_field_specs(self):
+        """
+        Get the compiled `FieldSpec` list for this form class
+
+        `include` is resolved, traversed and matched to a field builder the first time the class
+        is instantiated. Later instances reuse the result. Instances that set their own `include` or `model`
+        compile (and keep) their own specs.
+
+        :returns list: [FieldSpec,...]
+        """
+        cls = type(self)
+        if self.include is not cls.include or self.model is not cls.model:
+            specs = self.__dict__.get('_instance_field_specs')
+            if specs is None:
+                specs = self._instance_field_specs = self._compile_field_specs(self.model)
+            return specs
+        if cls._field_specs is None:
+            cls._field_specs = self._compile_field_specs(self.model)
+        return cls._field_specs
+
+    def _compile_field_specs(self, model):
+        """
+        Resolve every name in `self.include` to a `FieldSpec`
+
+        :param model: Model the `include` names are relative to
+        :type model: django.db.model
+        :returns list: [FieldSpec,...]
+        """
+        specs = []
+        for field in self.include:
+            try:
+                hops = compile_path(model, field)
+            except FieldDoesNotExist:
+                continue
+            model_field = hops[-1].field
+            builder = self._get_form_field_builder(model_field, field)
+            prototype = None
+            if builder in self.static_builders:
+                prototype = getattr(self, builder)(model_field, field)
+            specs.append(FieldSpec(field, model_field, builder, prototype, hops))
+        return specs
+
+    def _get_resolved_field_specs(self):
+        """
+        Get the compiled `FieldSpec` list with the `widget_policy` builders picked for this instance
+
+        :returns list: [FieldSpec,...]
+        """
+        specs = self._get_field_specs()
+        if not self.widget_policy:
+            return specs
+        resolved = self.__dict__.get('_resolved_field_specs')
+        if resolved is None:
+            resolved = [spec._replace(builder=self._get_policy_builder(spec.model_field, spec.name))
+                        if spec.builder == '_build_policy_field' else spec
+                        for spec in specs]
+            self._resolved_field_specs = resolved
+        return resolved
+
+    @classmethod
+    def get_path_hops(cls, name):
+        """
+        Get the compiled relation path of a name in `include`
+
+        :param name: orm field name relative to `model`
+        :type name: str
+        :returns tuple: (PathHop(model, field, is_to_many),...) see :func:`modelqueryform.utils.compile_path`
+        """
+        return compile_path(cls.model, name)
+
+    def span(self, phase, field=None):
+        """
+        Context manager timing a phase of this form, see :mod:`modelqueryform.instrumentation`
+
+        Use it to attribute your own work to the form, eg. evaluating the QuerySet from `process()`::
+
+            with form.span('evaluate'):
+                rows = list(form.process())
+
+        :param phase: Name of the phase
+        :type phase: str
+        :param field: Form field name the phase is attributed to
+        :type field: str
+        """
+        return instrumentation.span(self, phase, field)
+
+    def full_clean(self):
+        with self.span('clean'):
+            super(ModelQueryForm, self).full_clean()
 
     def clean(self):
         cleaned_data = super(ModelQueryForm, self).clean()
@@ -41,23 +314,30 @@ class ModelQueryForm(Form):
 
     def _build_form(self, model, field_prepend=None):
         """
-        Iterates through model fields to generate modelqueryform fields matching `self.include`
-        Recursively called to correctly build relationship spanning form fields
+        Generate modelqueryform fields matching `self.include` from the compiled field specs
+        Fields that only depend on the model definition are copied from the class prototypes
+        The bounds of every default `RangeField` are fetched together in one aggregate query
 
         :param model: Current model to inspect. Alwasy starts with `self.model`
         :type model: django.db.model
         :param field_prepend: Relation field name if using `self.traverse`
         :type field_prepend: str
         """
-        for field in self.include:
-            try:
-                if "__" in field:
-                    model_field = traverse_related_to_field(field, model)
-                else:
-                    model_field = model._meta.get_field(field)
-                self.fields[field] = self._build_form_field(model_field, field)
-            except FieldDoesNotExist:
-                pass
+        specs = self._get_resolved_field_specs()
+        with self.span('range_bounds'):
+            self._range_bounds = self.get_range_bounds([spec.name for spec in specs
+                                                        if spec.builder == '_build_range_field'])
+        for spec in specs:
+            with self.span('build_field', spec.name):
+                self.fields[spec.name] = self._build_spec_field(spec)
+
+    def _build_spec_field(self, spec):
+        """
+        Build the form field for a `FieldSpec`, copying its prototype when it has one
+        """
+        if spec.prototype is not None:
+            return copy.deepcopy(spec.prototype)
+        return self._call_form_field_builder(spec.builder, spec.model_field, spec.name)
 
     def _build_form_field(self, model_field, name):
         """ Build a form field for a given model field
@@ -84,24 +364,122 @@ class ModelQueryForm(Form):
         :raises NotImplementedError: For fields that do not have a default `ModelQueryForm` field builder and no custom
         field builder can be found
         """
+        return self._call_form_field_builder(self._get_form_field_builder(model_field, name),
+                                             model_field,
+                                             name)
+
+    def _get_form_field_builder(self, model_field, name):
+        """
+        Pick the form field builder for a model field, see :meth:`_build_form_field` for the order
+
+        :returns str: Name of the builder method on this form
+        """
         if hasattr(self, "build_%s" % name.lower()):
-            return getattr(self, "build_%s" % name.lower())(model_field)
+            return "build_%s" % name.lower()
         if hasattr(self, "build_type_%s" % model_field.get_internal_type().lower()):
-            return getattr(self, "build_type_%s" % model_field.get_internal_type().lower())(model_field)
+            return "build_type_%s" % model_field.get_internal_type().lower()
+        if name in self.autocomplete_fields:
+            return '_build_autocomplete_field'
+        if self.widget_policy and (not model_field.choices == [] or
+                                   model_field.get_internal_type() in self.numeric_fields() + self.rel_fields()):
+            return '_build_policy_field'
         if not model_field.choices == []:
-            return get_multiplechoice_field(model_field, model_field.choices)
+            return '_build_choices_field'
 
         if model_field.get_internal_type() in self.numeric_fields():
-            return get_range_field(self.model, model_field, name)
+            return '_build_range_field'
         if model_field.get_internal_type() in self.choice_fields():
-            choices = [[True, 'Yes'], [False, 'No']]
-            if model_field.get_internal_type() == "NullBooleanField":
-                choices += [[None, 'Unknown']]
-            return get_multiplechoice_field(model_field, choices)
+            return '_build_boolean_field'
         if model_field.get_internal_type() in self.rel_fields():
-            choices = self.get_related_choices(model_field)
-            return get_multiplechoice_field(model_field, choices)
+            return '_build_related_field'
+
+        return '_build_not_implemented'
+
+    def _get_policy_builder(self, model_field, name):
+        """
+        Pick a builder from the number of values a field has, for `widget_policy`
+
+        * Relations with more than `max_checkbox_choices` related rows get an `AutocompleteField`
+        * `choices` fields with more than `max_checkbox_choices` choices get a `RangeField` if they are numeric
+        * Numeric fields with at most `max_checkbox_choices` distinct values get checkboxes of those values
+
+        Counts come from :func:`modelqueryform.utils.estimate_cardinality`, cached in `self.cache`
+        so the choice follows its timeout and invalidation. Bound forms keep the range or checkboxes of a
+        submitted numeric field whatever the estimate is now, so the filter isn't lost when the choice changed
+        between rendering and submitting the form
+
+        :returns str: Name of the builder method
+        """
+        internal_type = model_field.get_internal_type()
+        if self.is_bound and model_field.choices == [] and internal_type in self.numeric_fields():
+            name_prefixed = self.add_prefix(name)
+            if any('%s_%s' % (name_prefixed, i) in self.data for i in range(3)):
+                return '_build_range_field'
+            if name_prefixed in self.data:
+                return '_build_distinct_field'
+        if internal_type in self.rel_fields():
+            if estimate_cardinality(self.model, name, self.max_checkbox_choices,
+                                    cache=self.cache) > self.max_checkbox_choices:
+                return '_build_autocomplete_field'
+            return '_build_related_field'
+        if not model_field.choices == []:
+            if len(model_field.choices) > self.max_checkbox_choices and internal_type in self.numeric_fields():
+                return '_build_range_field'
+            return '_build_choices_field'
+        if internal_type in self.numeric_fields():
+            if estimate_cardinality(self.model, name, self.max_checkbox_choices,
+                                    cache=self.cache) > self.max_checkbox_choices:
+                return '_build_range_field'
+            return '_build_distinct_field'
+        return '_build_not_implemented'
+
+    def _call_form_field_builder(self, builder, model_field, name):
+        """
+        Call a builder returned by :meth:`_get_form_field_builder`
+
+        .. note:: `build_FIELD` and `build_type_FIELD` methods only get the model field
+        """
+        if builder.startswith('_'):
+            return getattr(self, builder)(model_field, name)
+        return getattr(self, builder)(model_field)
+
+    def _build_choices_field(self, model_field, name):
+        return get_multiplechoice_field(model_field, model_field.choices)
+
+    def _build_range_field(self, model_field, name):
+        bounds = self._range_bounds.get(name)
+        return get_range_field(self.model, model_field, name, bounds=bounds)
+
+    def _build_policy_field(self, model_field, name):
+        return self._call_form_field_builder(self._get_policy_builder(model_field, name), model_field, name)
+
+    def _build_distinct_field(self, model_field, name):
+        return get_multiplechoice_field(model_field, self.get_distinct_choices(name))
 
+    def _build_boolean_field(self, model_field, name):
+        choices = [[True, 'Yes'], [False, 'No']]
+        if model_field.get_internal_type() == "NullBooleanField":
+            choices += [[None, 'Unknown']]
+        return get_multiplechoice_field(model_field, choices)
+
+    def _build_related_field(self, model_field, name):
+        return get_multiplechoice_field(model_field, self.get_related_choices(model_field))
+
+    def _build_autocomplete_field(self, model_field, name):
+        if model_field.get_internal_type() not in self.rel_fields():
+            raise TypeError("%s cannot be an autocomplete field."
+                            "Autocomplete fields must be one of type ForeignKey, OneToOneField, ManyToManyField"
+                            % model_field
+                            )
+        url = reverse_lazy('modelqueryform:autocomplete',
+                           kwargs={'form': self.get_form_key(), 'field': name})
+        return AutocompleteField(label=model_field.verbose_name,
+                                 required=False,
+                                 queryset=self.get_autocomplete_queryset(model_field, name),
+                                 label_field=self.related_choice_labels.get(model_field.name, 'pk'),
+                                 url=url)
+
+    def _build_not_implemented(self, model_field, name):
         raise NotImplementedError(
             "Field %s doesn't have default field.choices and "
             "ModelQueryForm doesn't have a default field builder for type %s."
@@ -146,6 +524,60 @@ class ModelQueryForm(Form):
                 'OneToOneField',
                 ]
 
+    def get_range_bounds(self, names):
+        """Get the (min, max) of fields, from the summary table with `use_summaries`
+        and from `self.cache` when there is one
+
+        :param names: orm field names relative to `self.model`
+        :type names: list
+        :returns dict: {name: (min, max),...}
+        """
+        bounds = {}
+        if self.use_summaries and names:
+            from .summary import get_summary_bounds
+            bounds = get_summary_bounds(self.model, names)
+            names = [name for name in names if name not in bounds]
+            if not names:
+                return bounds
+
+        if self.cache is None or not names:
+            bounds.update(get_range_bounds(self.model, names))
+            return bounds
+
+        models = set()
+        for name in names:
+            models.update(get_path_models(name, self.model))
+        bounds.update(self.cache.get_or_set(('bounds', self.model._meta.label, tuple(sorted(names))),
+                                            models,
+                                            lambda: get_range_bounds(self.model, names)))
+        return bounds
+
+    def get_distinct_choices(self, name):
+        """
+        Get [[value, value],...] choices of the distinct values of a field, for `build_FIELD` hooks
+
+        Read from the summary table with `use_summaries` (if `name` is in `summary_distinct_fields`),
+        else with :func:`modelqueryform.utils.get_choices_from_distinct` using `self.cache`
+
+        :param name: orm field name relative to `self.model`
+        :type name: str
+        :returns list:
+        """
+        if self.use_summaries and name in self.summary_distinct_fields:
+            from .summary import get_summary_choices
+            choices = get_summary_choices(self.model, name)
+            if choices is not None:
+                return choices
+        return get_choices_from_distinct(self.model, name, cache=self.cache)
+
+    def _get_related_choice_label(self, model_field):
+        """
+        :returns: The label for lightweight related choices of `model_field`, None for model instance labels
+        """
+        if self.lightweight_related_choices or model_field.name in self.related_choice_labels:
+            return self.related_choice_labels.get(model_field.name, 'pk')
+        return None
+
     def get_related_choices(self, model_field):
         """Make choices from a related
 
@@ -154,9 +586,30 @@ class ModelQueryForm(Form):
         :returns list: [[field.pk, field.__str__()],...]
         :raises TypeError: If `model_field` is not a relationship type
 
+        .. note::
+            With `lightweight_related_choices` (or the field in `related_choice_labels`) the choices are
+            ((pk, str(label)),...) built by :func:`modelqueryform.utils.get_choices_from_values`
+
         """
         if model_field.get_internal_type() in self.rel_fields():
-            choices = [[fkf.pk, fkf] for fkf in model_field.related_model.objects.all()]
+            related_model = model_field.related_model
+
+            label = self._get_related_choice_label(model_field)
+            if label is not None:
+                key = ('related_values', related_model._meta.label, "%s" % label)
+
+                def compute():
+                    return get_choices_from_values(related_model, label, self.related_choices_chunk_size)
+            else:
+                key = ('related_choices', related_model._meta.label)
+
+                def compute():
+                    return [[fkf.pk, fkf] for fkf in related_model.objects.all()]
+
+            if self.cache is None:
+                choices = compute()
+            else:
+                choices = self.cache.get_or_set(key, [related_model], compute)
         else:
             raise TypeError("%s cannot be used for traversal."
                             "Traversal fields must be one of type ForeignKey, OneToOneField, ManyToManyField"
@@ -164,40 +617,425 @@ class ModelQueryForm(Form):
                             )
         return choices
 
-    def process(self, data_set=None):
+    def process(self, data_set=None, load_related=False):
         """Filter a QuerySet with the POSTed form values
 
-        :param data_set: QuerySet to filter against
+        :param data_set: QuerySet or Manager to filter against
         :type data_set: QuerySet (Same Model class as self.model)
+        :param load_related: Load the relations of the `include` paths and `display_fields` with the results,
+            see :meth:`get_related_plan`
+        :type load_related: bool
 
         .. note:: If data_set == None, self.model.objects.all() is used
 
         :returns QuerySet: data_set.filter(Q object)
         :raises ImproperlyConfigured: No `data_set` to filter
-        :raises TypeError: `data_set` is not an instance (using `isinstance()`) of `self.model`
+        :raises TypeError: `data_set.model` is not `self.model`, a subclass of it or a proxy of the same model
+        """
+        with self.span('process'):
+            data_set = self._get_data_set(data_set)
+
+            query = self._get_query()
+            if query is not None:
+                data_set = data_set.filter(query)
+
+            if load_related:
+                select_related, prefetch_related = self.get_related_plan()
+                if select_related:
+                    data_set = data_set.select_related(*select_related)
+                if prefetch_related:
+                    data_set = data_set.prefetch_related(*prefetch_related)
+
+            if self.explain_queries:
+                return self.check_query_plan(data_set)
+            return data_set
+
+    def get_related_plan(self):
+        """
+        Plan how `process(load_related=True)` loads the relations of the `include` paths and `display_fields`
+
+        Relations reached only through single valued hops (ForeignKey, OneToOneField) are joined with
+        `select_related()`. From the first many valued hop on they are loaded with `prefetch_related()`,
+        using `only()` with the `display_fields` of the relation when it has any (plus the foreign keys
+        that the relation itself and deeper prefetches go through).
+
+        :returns tuple: ([select_related path,...], [prefetch_related lookup,...])
+        """
+        select_related = []
+        prefetch_related = OrderedDict()
+        paths = [spec.name for spec in self._get_field_specs()] + list(self.display_fields)
+        for path in paths:
+            hops = compile_path(self.model, path)
+            if hops[-1].field.related_model is None:
+                hops = hops[:-1]
+
+            query_names = []
+            accessor_names = []
+            to_many = False
+            for hop in hops:
+                query_names.append(hop.field.name)
+                accessor_names.append(hop.field.get_accessor_name() if hop.field.auto_created and
+                                      not hop.field.concrete else hop.field.name)
+                to_many = to_many or hop.is_to_many
+                if not to_many:
+                    if "__".join(query_names) not in select_related:
+                        select_related.append("__".join(query_names))
+                elif "__".join(accessor_names) not in prefetch_related:
+                    prefetch_related["__".join(accessor_names)] = (hop, "__".join(query_names))
+
+        lookups = []
+        for lookup, (hop, query_path) in prefetch_related.items():
+            fields = self.display_fields.get(query_path)
+            if not fields:
+                lookups.append(lookup)
+                continue
+            only = list(fields)
+            if hop.field.one_to_many:
+                only.append(hop.field.field.name)
+            for deeper, (next_hop, next_path) in prefetch_related.items():
+                if deeper.startswith(lookup + '__') and deeper.count('__') == lookup.count('__') + 1 and \
+                        next_hop.field.concrete and not next_hop.field.many_to_many:
+                    only.append(next_hop.field.name)
+            lookups.append(Prefetch(lookup, queryset=hop.field.related_model.objects.only(*only)))
+        return select_related, lookups
+
+    def process_cached(self, data_set=None, fields=None):
+        """Get the pks (or `fields` values) of the rows `process()` matches from `result_cache`
+
+        Results are keyed by :meth:`query_fingerprint` and by the data version of every model `include` reads,
+        so saving or deleting any of those models invalidates them.
+
+        .. note:: If `data_set` filters on models that aren't in `include` their writes won't invalidate results
+
+        :param data_set: QuerySet to filter against, see :meth:`process`
+        :type data_set: QuerySet
+        :param fields: Field names to project, as for `values_list()`
+        :type fields: list
+        :returns list: [pk,...] or [(value, value,...),...] when `fields` is given
+        :raises ImproperlyConfigured: If `result_cache` is not set
+        """
+        if self.result_cache is None:
+            raise ImproperlyConfigured("process_cached needs a result_cache defined as a class attribute")
+
+        data_set_key = None
+        if data_set is not None:
+            data_set = self._get_data_set(data_set)
+            try:
+                sql, params = data_set.query.sql_with_params()
+            except EmptyResultSet:
+                data_set_key = 'empty'
+            else:
+                data_set_key = hashlib.sha256(("%s %s %r" % (data_set.db, sql, params)).encode('utf-8')).hexdigest()
+
+        def compute():
+            queryset = self.process(data_set)
+            with self.span('evaluate'):
+                if fields:
+                    return list(queryset.values_list(*fields))
+                return list(queryset.values_list('pk', flat=True))
+
+        key = ('results', self.query_fingerprint(), tuple(fields or ()), data_set_key)
+        return self.result_cache.get_or_set(key, self.get_include_models(), compute)
+
+    def get_include_models(self):
+        """
+        Get every model whose data the `include` paths read
+
+        :returns set: {Model,...}
+        """
+        models = set([self.model])
+        for spec in self._get_field_specs():
+            models.update(get_path_models(spec.name, self.model))
+        return models
+
+    def export(self, format='csv', fields=None, chunk_size=2000, data_set=None, header=True):
+        """
+        Stream the rows `process()` matches as lines of text, for a `StreamingHttpResponse`::
+
+            response = StreamingHttpResponse(form.export('csv'), content_type='text/csv')
+
+        Rows are read with `values_list().iterator()` (a server-side cursor where the backend has them),
+        `chunk_size` at a time, so memory use doesn't grow with the number of rows.
+        Lines are made by `export_FORMAT(fields, rows, header)`, 'csv' and 'jsonl' are built in.
+
+        .. note:: Columns following a many valued relation give one line per related row
+
+        :param format: Name of the format
+        :type format: str
+        :param fields: orm field names for the columns, defaults to 'pk' and the `include` paths
+        :type fields: list
+        :param chunk_size: Rows fetched from the database cursor at a time
+        :type chunk_size: int
+        :param data_set: QuerySet to filter against, see :meth:`process`
+        :type data_set: QuerySet
+        :param header: Start with a line of the field names (if the format has one)
+        :type header: bool
+        :returns: generator of str
+        :raises ValueError: For unknown formats or fields
+        """
+        writer = getattr(self, 'export_%s' % format, None)
+        if writer is None:
+            raise ValueError("%s doesn't have an export_%s method" % (type(self).__name__, format))
+
+        fields = list(fields) if fields else ['pk'] + list(self.include)
+        for field in fields:
+            if field != 'pk':
+                try:
+                    compile_path(self.model, field)
+                except FieldDoesNotExist as e:
+                    raise ValueError("Can't export %s: %s" % (field, e))
+
+        queryset = self.process(data_set).values_list(*fields)
+        return writer(fields, iterate_in_chunks(queryset, chunk_size), header)
+
+    def export_csv(self, fields, rows, header=True):
+        """
+        CSV lines for :meth:`export`
+
+        :param fields: Column names
+        :param rows: Iterable of value tuples
+        :param header: Start with a line of the column names
+        :returns: generator of str
+        """
+        line = _LineBuffer()
+        writer = csv.writer(line)
+        if header:
+            yield writer.writerow(fields)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def export_jsonl(self, fields, rows, header=True):
+        """
+        JSON Lines for :meth:`export`, one {field: value,...} object per row (there's no header line)
+
+        :param fields: Object keys
+        :param rows: Iterable of value tuples
+        :param header: Ignored
+        :returns: generator of str
+        """
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(OrderedDict(zip(fields, row))) + "\n"
+
+    def _get_data_set(self, data_set):
+        """
+        Get the QuerySet `process()` and friends filter
+
+        :param data_set: QuerySet, Manager or None for self.model.objects.all()
+        :returns QuerySet:
+        :raises TypeError: `data_set.model` is not `self.model`, a subclass of it or a proxy of the same model
         """
         if data_set is None:
-            data_set = self.model.objects.all()
+            return self.model.objects.all()
 
-        else:
-            if data_set.first() is not None and not isinstance(data_set.first(), self.model):
-                raise TypeError("Match the QuerySet to this form instances Model")
+        if isinstance(data_set, Manager):
+            data_set = data_set.all()
+        if not self._is_form_model(getattr(data_set, 'model', None)):
+            raise TypeError("Match the QuerySet to this form instances Model")
+        return data_set
 
-        query = self._get_query()
-        if query is not None:
-            return data_set.filter(query)
-        else:
-            return data_set
+    def facet_counts(self, data_set=None):
+        """
+        Count the matching rows for every choice of every choice field in `include`
+
+        The count for a choice of field FIELD applies the filters of every other changed field
+        (but not FIELD's own), so the counts show what selecting that choice would add.
+        All counts come from conditional aggregates, `facet_chunk_size` per query.
+
+        .. note:: Call `is_valid()` first for the counts to respect the submitted filters
+
+        :param data_set: QuerySet to count against, see :meth:`process`
+        :type data_set: QuerySet
+        :returns OrderedDict: {form field name: OrderedDict({choice value: count,...}),...}
+        """
+        data_set = self._get_data_set(data_set)
+        filters = self._get_named_filters() if hasattr(self, 'cleaned_data') else {}
+
+        facets = OrderedDict()
+        aggregates = []
+        for field_name, form_field in self.fields.items():
+            if type(form_field) is not MultipleChoiceField:
+                continue
+            other_filters = [q_object for name, q_object in filters.items() if name != field_name]
+            facets[field_name] = OrderedDict()
+            for value, label in form_field.choices:
+                condition = self._get_field_filter(field_name, ["%s" % value])
+                if other_filters:
+                    condition = flatten_q(other_filters + [condition], Q.AND)
+                facets[field_name][value] = 0
+                aggregates.append((field_name, value, condition))
+
+        with self.span('facet_counts'):
+            for start in range(0, len(aggregates), self.facet_chunk_size):
+                chunk = aggregates[start:start + self.facet_chunk_size]
+                counts = data_set.aggregate(**dict(
+                    ('facet_%s' % index, Count(Case(When(condition, then=F('pk'))), distinct=True))
+                    for index, (field_name, value, condition) in enumerate(chunk)
+                ))
+                for index, (field_name, value, condition) in enumerate(chunk):
+                    facets[field_name][value] = counts['facet_%s' % index]
+        return facets
+
+    @classmethod
+    def batch_counts(cls, forms, data_set=None, chunk_size=None):
+        """
+        Count the rows matched by many bound forms of the same model, eg. saved searches::
+
+            counts = MyModelQueryForm.batch_counts(MyModelQueryForm(search.data) for search in searches)
+
+        Every form's query is a conditional aggregate, so `chunk_size` forms are counted per query
+        instead of one `process().count()` each. Forms are validated and can be of different
+        ModelQueryForm classes as long as they share `cls.model`.
+
+        :param forms: Bound ModelQueryForms
+        :type forms: iterable
+        :param data_set: QuerySet to count against, see :meth:`process`
+        :type data_set: QuerySet
+        :param chunk_size: Maximum number of forms counted per query, defaults to `facet_chunk_size`
+        :type chunk_size: int
+        :returns list: The count of each form, in order, None for invalid forms
+        :raises TypeError: A form's model or `data_set.model` is not `cls.model`
+        """
+        forms = list(forms)
+        chunk_size = chunk_size or cls.facet_chunk_size
+        for form in forms:
+            if form.model is not cls.model:
+                raise TypeError("Every form counted by %s.batch_counts() must use %s" %
+                                (cls.__name__, cls.model._meta.label))
+
+        counts = [None] * len(forms)
+        aggregates = []
+        for index, form in enumerate(forms):
+            if form.is_valid():
+                query = form._get_query()
+                aggregates.append((index, When(query, then=F('pk')) if query is not None else None))
+        if not aggregates:
+            return counts
+
+        data_set = forms[0]._get_data_set(data_set)
+        with forms[0].span('batch_counts'):
+            for start in range(0, len(aggregates), chunk_size):
+                chunk = aggregates[start:start + chunk_size]
+                results = data_set.aggregate(**dict(
+                    ('count_%s' % index, Count(Case(condition) if condition is not None else 'pk', distinct=True))
+                    for index, condition in chunk
+                ))
+                for index, condition in chunk:
+                    counts[index] = results['count_%s' % index]
+        return counts
+
+    def check_query_plan(self, queryset):
+        """
+        EXPLAIN `queryset`, keep the plan in `self.query_plan` and enforce
+        `max_query_cost` and `allow_full_scans`
+
+        :param queryset: QuerySet built by `process()`
+        :type queryset: QuerySet
+        :returns QuerySet: `queryset`, or :meth:`downgrade_query` for rejected plans when
+            `query_guard_action` is 'downgrade'
+        :raises QueryTooExpensive: For rejected plans when `query_guard_action` is 'raise'
+        """
+        self.query_plan = plan = explain_queryset(queryset)
+
+        reason = None
+        if self.max_query_cost is not None and plan.cost is not None and plan.cost > self.max_query_cost:
+            reason = "Query cost %s is over the maximum of %s" % (plan.cost, self.max_query_cost)
+        elif not self.allow_full_scans and plan.full_scans:
+            reason = "Query needs a full table scan of %s" % ", ".join(plan.full_scans)
+
+        if reason is None:
+            return queryset
+        if self.query_guard_action == 'downgrade':
+            return self.downgrade_query(queryset, plan)
+        raise QueryTooExpensive(reason, plan)
+
+    def downgrade_query(self, queryset, plan):
+        """
+        Replacement for a QuerySet whose plan was rejected
+
+        .. note:: Override this to return something cheaper than the rejected query (eg. a narrower filter)
+
+        :param queryset: Rejected QuerySet
+        :param plan: `modelqueryform.explain.QueryPlan` of `queryset`
+        :returns QuerySet: queryset.none()
+        """
+        return queryset.none()
+
+    def _is_form_model(self, model):
+        """
+        Check that rows of `model` can be filtered by this form, without querying
+
+        :param model: Model of the QuerySet to filter
+        :returns bool: True for `self.model`, its subclasses and proxies of the same concrete model
+        """
+        if not isinstance(model, type):
+            return False
+        if issubclass(model, self.model):
+            return True
+        return model._meta.concrete_model is self.model._meta.concrete_model
 
     def _get_query(self):
+        memo = self._get_memo('query')
+        if memo is not None:
+            return memo[0]
+
         filters = self.get_filters()
 
+        query = None
         if filters.values():
-            return self._test_filter_func_is_Q(
+            query = self._test_filter_func_is_Q(
                 self.build_query_from_filters(filters)
             )
+        self._set_memo('query', (query,))
+        return query
+
+    def _get_memo(self, name):
+        """
+        Get a value memoized by :meth:`_set_memo` for the current `cleaned_data`
+
+        :returns: The memoized value or None if it was memoized for another validation
+        """
+        memo = self.__dict__.get('_memo_%s' % name)
+        if memo is not None and memo[0] is getattr(self, 'cleaned_data', None):
+            return memo[1]
         return None
 
+    def _set_memo(self, name, value):
+        """
+        Memoize a value derived from `cleaned_data` until the form is validated again
+        """
+        self.__dict__['_memo_%s' % name] = (getattr(self, 'cleaned_data', None), value)
+
+    def _get_field_hooks(self, field_name):
+        """
+        Get the `FieldHooks` for a form field name, looked up once per form class and model
+        (instances can set their own `model`)
+
+        :param field_name: Form field name
+        :type field_name: str
+        :returns FieldHooks:
+        """
+        key = (self.model, field_name)
+        hooks = type(self)._field_hooks.get(key)
+        if hooks is None:
+            field = traverse_related_to_field(field_name, self.model)
+            name = field.name.lower()
+            internal_type = field.get_internal_type().lower()
+
+            filter_hook = None
+            if hasattr(self, "filter_%s" % name):
+                filter_hook = "filter_%s" % name
+            elif hasattr(self, "filter_type_%s" % internal_type):
+                filter_hook = "filter_type_%s" % internal_type
+
+            hooks = FieldHooks(field,
+                               filter_hook,
+                               "print_%s" % name if hasattr(self, "print_%s" % name) else None,
+                               "print_type_%s" % internal_type if hasattr(self, "print_type_%s" % internal_type)
+                               else None)
+            type(self)._field_hooks[key] = hooks
+        return hooks
+
     def get_filters(self):
         """ Get a dict of the POSTed form values as Q objects
         Form fields will be evaluated in the following order to generate a Q object:
@@ -217,41 +1055,102 @@ class ModelQueryForm(Form):
         custom filter builder can be found
         """
         filters = {}
-        for field_name in self.changed_data:
-            values = self.cleaned_data[field_name]
-            if values:
-                field = traverse_related_to_field(field_name, self.model)
-                if hasattr(self, "filter_%s" % field.name.lower()):
-                    filters[field] = self._test_filter_func_is_Q(
-                        getattr(self, "filter_%s" %
-                                field.name.lower()
-                                )(field_name, values)
-                    )
-                elif hasattr(self, "filter_type_%s" % field.get_internal_type().lower()):
-                    filters[field] = self._test_filter_func_is_Q(
-                        getattr(self, "filter_type_%s" %
-                                field.get_internal_type().lower()
-                                )(field_name, values)
-                    )
-                elif type(self.fields[field_name]) is RangeField:
-                    filters[field] = self._test_filter_func_is_Q(
-                        get_range_field_filter(field_name, values)
-                    )
-                elif type(self.fields[field_name]) is MultipleChoiceField:
-                    filters[field] = self._test_filter_func_is_Q(
-                        get_multiplechoice_field_filter(field_name, values)
-                    )
-                else:
-                    raise NotImplementedError(
-                        "ModelQueryForm doesn't have a default field processor for type %s."
-                        "Please define either a method filter_type_%s(self, field, values) for fields of this type or"
-                        "filter_%s(self, field, values) for this field specifically"
-                        % (field.get_internal_type().lower(),
-                           field.get_internal_type().lower(),
-                           field.name.lower())
-                    )
+        for field_name, q_object in self._get_named_filters().items():
+            filters[self._get_field_hooks(field_name).model_field] = q_object
+        return filters
+
+    def _get_named_filters(self):
+        """
+        Get the Q objects for the changed fields keyed by form field name, see :meth:`get_filters`
+
+        .. note:: Memoized until the form is validated again
+
+        :returns OrderedDict: {Form field name: Q object,...}
+        """
+        memo = self._get_memo('filters')
+        if memo is not None:
+            return memo
+
+        filters = OrderedDict()
+        with self.span('filters'):
+            for field_name in self.changed_data:
+                values = self.cleaned_data[field_name]
+                if values:
+                    with self.span('filter', field_name):
+                        filters[field_name] = self._get_field_filter(field_name, values)
+        self._set_memo('filters', filters)
         return filters
 
+    def _get_field_filter(self, field_name, values):
+        """
+        Get the Q object for a single form field, see :meth:`get_filters` for the order builders are tried in
+
+        :param field_name: Form field name
+        :type field_name: str
+        :param values: Cleaned value(s) for the field
+        :returns Q:
+        """
+        hooks = self._get_field_hooks(field_name)
+        field = hooks.model_field
+        if hooks.filter is not None:
+            q_object = self._test_filter_func_is_Q(
+                getattr(self, hooks.filter)(field_name, values)
+            )
+        elif type(self.fields[field_name]) is RangeField:
+            q_object = self._test_filter_func_is_Q(
+                get_range_field_filter(field_name, values)
+            )
+        elif type(self.fields[field_name]) in (MultipleChoiceField, AutocompleteField):
+            null_choice = any(value is None for value, label in self.fields[field_name].choices)
+            q_object = self._test_filter_func_is_Q(
+                get_multiplechoice_field_filter(field_name, values, null_choice)
+            )
+        else:
+            raise NotImplementedError(
+                "ModelQueryForm doesn't have a default field processor for type %s."
+                "Please define either a method filter_type_%s(self, field, values) for fields of this type or"
+                "filter_%s(self, field, values) for this field specifically"
+                % (field.get_internal_type().lower(),
+                   field.get_internal_type().lower(),
+                   field.name.lower())
+            )
+
+        if self._get_to_many_filter(field_name) == 'semijoin':
+            return self.semijoin_filter(q_object)
+        return q_object
+
+    def _get_to_many_filter(self, field_name):
+        """
+        Get how the filter of a form field is applied, see `to_many_filter`
+
+        :param field_name: Form field name
+        :type field_name: str
+        :returns str: 'join' or 'semijoin', always 'join' for paths without a many valued hop
+        :raises ImproperlyConfigured: For strategies other than 'join' and 'semijoin'
+        """
+        strategy = self.to_many_filters.get(field_name, self.to_many_filter)
+        if strategy not in ('join', 'semijoin'):
+            raise ImproperlyConfigured("%s is not a to many filter strategy, use 'join' or 'semijoin'" % strategy)
+        if strategy == 'semijoin' and path_is_to_many(self.get_path_hops(field_name)):
+            return 'semijoin'
+        return 'join'
+
+    def semijoin_filter(self, q_object):
+        """
+        Rewrite a filter as a semi-join: `pk__in` a subquery of the rows matching `q_object`
+
+        The subquery does the joins of many valued relations, so the outer query returns every row
+        at most once without `distinct()`
+
+        .. note::
+            Override this to build a cheaper subquery (eg. one on the through model of a ManyToManyField)
+
+        :param q_object: Filter of a single form field
+        :type q_object: Q
+        :returns Q: Q(pk__in=subquery)
+        """
+        return Q(pk__in=self.model._base_manager.filter(q_object).values('pk'))
+
     def _test_filter_func_is_Q(self, filter_func):
         """
         Make sure that a filter is a Q object
@@ -270,6 +1169,8 @@ class ModelQueryForm(Form):
     def build_query_from_filters(self, filters):
         """Generate a Q object that is a logical AND of a list of Q objects
 
+        Nested ANDs are flattened and duplicate conditions dropped (see :func:`modelqueryform.utils.flatten_q`)
+
         .. note::
             Override this method to build a more complex Q object than AND(filters.values())
 
@@ -286,7 +1187,7 @@ class ModelQueryForm(Form):
         if not all(isinstance(value, Q) for value in values):
             raise TypeError("values in filter dict must be Q objects")
 
-        return reduce(operator.and_, values)
+        return flatten_q(values, Q.AND)
 
     def get_range_field_print(self, form_field, cleaned_field_data):
         """
@@ -342,6 +1243,8 @@ class ModelQueryForm(Form):
         :raises NotImplementedError: For fields that do not have a default print builder and no custom print builder
         can be found
         :raises ValueError: if any name in the field_to_print is not in self.changed_data
+
+        .. note:: Memoized until the form is validated again
         """
         vals = OrderedDict()
         if fields_to_print is None:
@@ -350,25 +1253,27 @@ class ModelQueryForm(Form):
             if not set(fields_to_print).issubset(set(self.changed_data)):
                 raise ValueError('field names in fields_to_print must be in self.changed_data')
 
+        memo_name = 'print_%s' % ",".join(sorted(fields_to_print))
+        memo = self._get_memo(memo_name)
+        if memo is not None:
+            return OrderedDict(memo)
+
         for field_name in sorted(fields_to_print):
             values = self.cleaned_data[field_name]
             if values:
-                field = traverse_related_to_field(field_name, self.model)
-                if hasattr(self, "print_%s" % field.name.lower()):
+                hooks = self._get_field_hooks(field_name)
+                field = hooks.model_field
+                if hooks.print_field is not None:
                     vals[self.fields[field_name].label] = \
-                        getattr(self, "print_%s" %
-                                field.name.lower()
-                                )(field, values)
-                elif hasattr(self, "print_type_%s" % field.get_internal_type().lower()):
+                        getattr(self, hooks.print_field)(field, values)
+                elif hooks.print_type is not None:
                     vals[self.fields[field_name].label] = \
-                        getattr(self, "print_type_%s" %
-                                field.get_internal_type().lower()
-                                )(field_name, values)
+                        getattr(self, hooks.print_type)(field_name, values)
                 elif type(self.fields[field_name]) is RangeField:
                     vals[self.fields[field_name].label] = \
                         self.get_range_field_print(self.fields[field_name],
                                                    values)
-                elif type(self.fields[field_name]) is MultipleChoiceField:
+                elif type(self.fields[field_name]) in (MultipleChoiceField, AutocompleteField):
                     vals[self.fields[field_name].label] = \
                         self.get_multichoice_field_print(self.fields[field_name],
                                                          values)
@@ -381,14 +1286,122 @@ class ModelQueryForm(Form):
                            field.get_internal_type().lower(),
                            field.name.lower())
                     )
+        self._set_memo(memo_name, OrderedDict(vals))
         return vals
 
     def query_hash(self):
         """
         Get an md5 hexdigest of the pretty_print_query().
 
-        .. note:: Useful for caching results of a given query
+        .. note::
+            Changes with labels and verbose names, use :meth:`query_fingerprint` for cache keys
 
         :returns str: 32 char md5.hexdigest()
         """
         return hashlib.md5(str(self.pretty_print_query()).encode('utf-8')).hexdigest()
+
+    def query_fingerprint(self):
+        """
+        Get a canonical fingerprint of the submitted filters, safe to use as a shared cache key
+
+        Built from the form class, the model and the cleaned values of the changed fields, sorted by name
+        and normalized with :func:`modelqueryform.utils.canonical_value`. It never queries the database and
+        doesn't depend on labels, verbose names, the order values were submitted in or the python process.
+
+        .. note:: Memoized until the form is validated again
+
+        :returns str: 64 char sha256.hexdigest()
+        """
+        memo = self._get_memo('fingerprint')
+        if memo is not None:
+            return memo
+
+        filters = sorted(
+            [field_name, canonical_value(self.cleaned_data[field_name])]
+            for field_name in self.changed_data
+            if self.cleaned_data.get(field_name)
+        )
+        payload = json.dumps([FINGERPRINT_VERSION,
+                              self.get_form_key(),
+                              self.model._meta.label,
+                              filters],
+                             sort_keys=True,
+                             separators=(',', ':'))
+        fingerprint = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        self._set_memo('fingerprint', fingerprint)
+        return fingerprint
+
+    def query_etag(self):
+        """
+        Get an ETag for the results of the submitted filters: the :meth:`query_fingerprint` combined with
+        the data version of every model `include` reads (kept by `result_cache`, or `cache` without one)
+
+        :returns str: 64 char sha256.hexdigest()
+        :raises ImproperlyConfigured: If neither `result_cache` nor `cache` is set
+        """
+        cache = self.result_cache if self.result_cache is not None else self.cache
+        if cache is None:
+            raise ImproperlyConfigured("query_etag needs a result_cache or cache defined as a class attribute")
+
+        models = self.get_include_models()
+        cache.watch(models)
+        raw = "%s:%r" % (self.query_fingerprint(), cache.get_versions(models))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def encode_query(self):
+        """
+        Encode the submitted filters as a compact, URL safe string, see :meth:`from_query`
+
+        The string is the version of the encoding and the canonical cleaned values of the changed fields
+        (see :func:`modelqueryform.utils.canonical_value`) so equal filters always encode the same.
+
+        .. note:: Call `is_valid()` first
+
+        :returns str: "VERSION.BASE64"
+        """
+        values = dict(
+            (field_name, canonical_value(self.cleaned_data[field_name]))
+            for field_name in self.changed_data
+            if self.cleaned_data.get(field_name)
+        )
+        payload = json.dumps(values, sort_keys=True, separators=(',', ':'))
+        encoded = base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+        return "%s.%s" % (QUERY_CODEC_VERSION, encoded)
+
+    @classmethod
+    def from_query(cls, query, **kwargs):
+        """
+        Get a bound form from a string made by :meth:`encode_query`::
+
+            query_form = MyModelQueryForm.from_query(request.GET['q'])
+
+        :param query: Encoded filters
+        :type query: str
+        :param kwargs: Passed on to the form, eg. `prefix`
+        :returns ModelQueryForm: Bound, not yet validated form
+        :raises ValueError: If the string can't be decoded, has another version or names unknown fields
+        """
+        try:
+            version, encoded = query.split('.', 1)
+            values = json.loads(base64.urlsafe_b64decode(
+                (encoded + '=' * (-len(encoded) % 4)).encode('ascii')
+            ).decode('utf-8'))
+        except (AttributeError, TypeError, ValueError, UnicodeError, binascii.Error):
+            raise ValueError("The query can't be decoded")
+        if version != "%s" % QUERY_CODEC_VERSION or not isinstance(values, dict):
+            raise ValueError("The query has version %s, expected %s" % (version, QUERY_CODEC_VERSION))
+
+        data = {}
+        form = cls(data, **kwargs)
+        for field_name, value in values.items():
+            if field_name not in form.fields:
+                raise ValueError("%s doesn't have a field %s" % (cls.__name__, field_name))
+            widget = form.fields[field_name].widget
+            key = form.add_prefix(field_name)
+            if isinstance(widget, MultiWidget):
+                for index, item in enumerate(widget.decompress(value)):
+                    if item is not None and item is not False:
+                        data['%s_%s' % (key, index)] = item
+            else:
+                data[key] = value
+        return form
@@ -0,0 +1,170 @@
+import logging
+import socket
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.db import connections, router
+from django.dispatch import Signal
+
+#: Sent when an instrumented phase of a ModelQueryForm finishes. `sender` is the form class,
+#: the arguments are `form` (the form instance) and `span` (a `Span`)
+form_span = Signal()
+
+Span = namedtuple('Span', ['phase', 'field', 'duration', 'queries'])
+Span.__doc__ = """
+A timed phase of a ModelQueryForm
+
+Phases are 'build' (with 'range_bounds' and one 'build_field' per field inside it), 'clean', 'filters'
+(with one 'filter' per changed field inside it), 'process', 'facet_counts' and 'evaluate'
+(`process_cached` running the query)
+
+:ivar str phase: Name of the phase
+:ivar str field: Form field name for per field phases, else None
+:ivar float duration: Wall time in seconds
+:ivar int queries: Queries run on the database of the form model, None if they can't be counted (Django < 2.0)
+"""
+
+
+@contextmanager
+def span(form, phase, field=None):
+    """
+    Time the enclosed code and send it as a `Span` with `form_span`
+
+    Does nothing but yield when `form_span` has no receivers for the form class
+
+    :param form: Form instance
+    :type form: ModelQueryForm
+    :param phase: Name of the phase
+    :type phase: str
+    :param field: Form field name the phase is attributed to
+    :type field: str
+    """
+    sender = type(form)
+    if not form_span.has_listeners(sender):
+        yield
+        return
+
+    connection = connections[router.db_for_read(form.model)]
+    counter = [0]
+
+    def count(execute, sql, params, many, context):
+        counter[0] += 1
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        if hasattr(connection, 'execute_wrapper'):
+            with connection.execute_wrapper(count):
+                yield
+        else:  # Django < 2.0
+            counter[0] = None
+            yield
+    finally:
+        form_span.send(sender, form=form, span=Span(phase, field, time.perf_counter() - start, counter[0]))
+
+
+class Instrument(object):
+    """
+    Base class for `form_span` receivers
+
+    :ivar sender: Form class the instrument is connected for, None for every form
+    """
+
+    def __call__(self, sender, form, span, **kwargs):
+        self.record(sender, form, span)
+
+    def record(self, sender, form, span):
+        """
+        Record a finished span
+
+        :param sender: Form class
+        :param form: Form instance
+        :param span: `Span`
+        """
+        raise NotImplementedError("Instruments must define record(sender, form, span)")
+
+    def connect(self, sender=None):
+        """
+        Receive the spans of `sender` (a form class) or of every form
+
+        :returns: self
+        """
+        self.sender = sender
+        form_span.connect(self, sender=sender, weak=False, dispatch_uid=self._dispatch_uid())
+        return self
+
+    def disconnect(self):
+        form_span.disconnect(sender=getattr(self, 'sender', None), dispatch_uid=self._dispatch_uid())
+
+    def _dispatch_uid(self):
+        return "modelqueryform.instrument.%s" % id(self)
+
+
+class LoggingInstrument(Instrument):
+    """
+    Log every span as "FormName phase[ field] 0.001234s 2 queries"
+
+    :ivar logger: `logging.Logger` or logger name
+    :ivar int level: Log level
+    """
+
+    def __init__(self, logger='modelqueryform', level=logging.INFO):
+        self.logger = logging.getLogger(logger) if isinstance(logger, str) else logger
+        self.level = level
+
+    def record(self, sender, form, span):
+        self.logger.log(self.level, "%s %s%s %.6fs %s queries",
+                        sender.__name__,
+                        span.phase,
+                        " %s" % span.field if span.field else "",
+                        span.duration,
+                        "?" if span.queries is None else span.queries)
+
+
+class StatsdClient(object):
+    """
+    Minimal fire and forget statsd client over UDP
+
+    :ivar str host: statsd host
+    :ivar int port: statsd port
+    """
+
+    def __init__(self, host='localhost', port=8125):
+        self.address = (host, port)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def timing(self, name, milliseconds):
+        self._send("%s:%.3f|ms" % (name, milliseconds))
+
+    def incr(self, name, count=1):
+        self._send("%s:%d|c" % (name, count))
+
+    def _send(self, data):
+        try:
+            self._socket.sendto(data.encode('utf-8'), self.address)
+        except (OSError, socket.error):
+            pass
+
+
+class StatsdInstrument(Instrument):
+    """
+    Send every span as a statsd timing PREFIX.FormName.phase[.field] and its queries as the counter
+    PREFIX.FormName.phase[.field].queries
+
+    :ivar client: Object with `timing(name, milliseconds)` and `incr(name, count)`, eg. a `StatsdClient`
+        or a client from the statsd package
+    :ivar str prefix: Prefix of the metric names
+    """
+
+    def __init__(self, client=None, prefix='modelqueryform'):
+        self.client = client if client is not None else StatsdClient()
+        self.prefix = prefix
+
+    def record(self, sender, form, span):
+        name = "%s.%s.%s" % (self.prefix, sender.__name__, span.phase)
+        if span.field:
+            name = "%s.%s" % (name, span.field)
+        self.client.timing(name, span.duration * 1000)
+        if span.queries:
+            self.client.incr(name + ".queries", span.queries)
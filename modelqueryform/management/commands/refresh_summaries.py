@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules, import_string
+
+from modelqueryform.forms import form_registry
+from modelqueryform.summary import refresh_form_summaries
+
+
+class Command(BaseCommand):
+    help = "Refresh the range bounds and distinct values stored for ModelQueryForms with use_summaries"
+
+    def add_arguments(self, parser):
+        parser.add_argument('forms', nargs='*', metavar='module.FormName',
+                            help="Forms to refresh, defaults to every form with use_summaries "
+                                 "in the forms module of an installed app")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Only read rows added since the last refresh (misses updates and deletes)")
+
+    def handle(self, *args, **options):
+        if options['forms']:
+            form_classes = []
+            for name in options['forms']:
+                try:
+                    form_classes.append(import_string(name))
+                except ImportError as e:
+                    raise CommandError("Can't import %s: %s" % (name, e))
+        else:
+            autodiscover_modules('forms')
+            form_classes = [form_registry[key] for key in sorted(form_registry) if form_registry[key].use_summaries]
+
+        for form_class in form_classes:
+            summaries = refresh_form_summaries(form_class, incremental=options['incremental'])
+            self.stdout.write("%s: %s summaries refreshed" % (form_class.get_form_key(), len(summaries)))
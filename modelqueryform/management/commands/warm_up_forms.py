@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import autodiscover_modules, import_string
+
+from modelqueryform.forms import form_registry
+from modelqueryform.warmup import get_warm_up_forms, warm_up_form
+
+
+class Command(BaseCommand):
+    help = "Compile ModelQueryForms and fill their caches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('forms', nargs='*', metavar='module.FormName',
+                            help="Forms to warm up, defaults to every form with warm_up "
+                                 "in the forms module of an installed app")
+        parser.add_argument('--all', action='store_true',
+                            help="Warm up every registered form, not only the ones with warm_up")
+
+    def handle(self, *args, **options):
+        if options['forms']:
+            form_classes = []
+            for name in options['forms']:
+                try:
+                    form_classes.append(import_string(name))
+                except ImportError as e:
+                    raise CommandError("Can't import %s: %s" % (name, e))
+        elif options['all']:
+            autodiscover_modules('forms')
+            form_classes = [form_registry[key] for key in sorted(form_registry)]
+        else:
+            form_classes = get_warm_up_forms()
+
+        for form_class in form_classes:
+            warm_up_form(form_class)
+            self.stdout.write("%s warmed up" % form_class.get_form_key())
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.28 on 2026-10-17 00:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FieldSummary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('path', models.CharField(max_length=255)),
+                ('bounds', models.TextField(null=True)),
+                ('distinct_values', models.TextField(null=True)),
+                ('last_pk', models.TextField(null=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('model', 'path')},
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import models
+
+
+class FieldSummary(models.Model):
+    """
+    Precomputed range bounds and distinct values of an orm path, see :mod:`modelqueryform.summary`
+
+    Values are stored as JSON so they don't depend on the type of the summarized field
+
+    :ivar str model: Label of the summarized model ('app_label.ModelName')
+    :ivar str path: orm field name relative to the model
+    :ivar str bounds: JSON [min, max], null when bounds aren't summarized
+    :ivar str distinct_values: JSON [value,...] sorted, null when distinct values aren't summarized
+    :ivar str last_pk: JSON pk of the last row summarized, incremental refreshes read the rows after it
+    """
+    model = models.CharField(max_length=100)
+    path = models.CharField(max_length=255)
+    bounds = models.TextField(null=True)
+    distinct_values = models.TextField(null=True)
+    last_pk = models.TextField(null=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('model', 'path')
+
+    def __str__(self):
+        return "%s %s" % (self.model, self.path)
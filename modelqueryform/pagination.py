@@ -0,0 +1,238 @@
+import base64
+import binascii
+import json
+import operator
+
+from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.db.models.query_utils import Q
+
+from .utils import compile_path, path_is_to_many
+
+try:
+    from functools import reduce
+except ImportError:  # Python < 3
+    pass
+
+
+class InvalidCursor(ValueError):
+    """
+    Raised for cursors that can't be decoded or were made for another query or ordering
+    """
+
+
+class KeysetPage(object):
+    """
+    One page of a `KeysetPaginator`
+
+    :ivar list object_list: Rows of the page
+    :ivar bool has_next: There are rows after this page
+    :ivar bool has_previous: There are rows before this page
+    :ivar str next_cursor: Cursor of the next page, None without one
+    :ivar str previous_cursor: Cursor of the previous page, None without one
+    """
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __repr__(self):
+        return "<KeysetPage of %s rows>" % len(self.object_list)
+
+
+class KeysetPaginator(object):
+    """
+    Paginate the rows a ModelQueryForm matches by seeking past the last row seen instead of using OFFSET
+
+    Every page is a single `WHERE (ordering) > (last values) ORDER BY ordering LIMIT page_size + 1` query
+    and nothing is counted, so deep pages cost the same as the first one (given an index on the ordering).
+    Cursors are opaque strings holding the form's :meth:`query_fingerprint`, the ordering and the
+    ordering values of the last row seen.
+
+    NULL ordering values sort before every other value (`NULLS FIRST` ascending, `NULLS LAST` descending)
+    on every backend, and the seek clauses match them with `__isnull`.
+
+    :ivar form: Validated ModelQueryForm
+    :ivar int page_size: Rows per page
+    :ivar list ordering: orm field names ('-' prefixed for descending), 'pk' is added as a tie breaker.
+        Relations are ordered by their raw value (eg. `institution_id`), not the related model's `Meta.ordering`
+    """
+
+    def __init__(self, form, page_size=25, ordering=('pk',), data_set=None):
+        """
+        :param data_set: QuerySet to filter against, see `ModelQueryForm.process`
+        :raises ValueError: If an ordering field doesn't exist, follows a many valued relation or ends on
+            a reverse relation
+        """
+        self.form = form
+        self.page_size = page_size
+        self.data_set = data_set
+        self.ordering = []
+        self._nullable = {}
+        self._fields = {'pk': form.model._meta.pk}
+
+        for name in ordering:
+            descending = name.startswith('-')
+            field = name.lstrip('-')
+            if field != 'pk':
+                try:
+                    hops = compile_path(form.model, field)
+                except FieldDoesNotExist as e:
+                    raise ValueError("Can't order by %s: %s" % (field, e))
+                if path_is_to_many(hops):
+                    raise ValueError("Can't order by %s, it follows a many valued relation" % field)
+                last = hops[-1].field
+                if last.is_relation:
+                    if not last.concrete:
+                        raise ValueError("Can't order by %s, order by a field of the related model" % field)
+                    field = "__".join(field.split("__")[:-1] + [last.attname])
+                self._nullable[field] = any(getattr(hop.field, 'null', False) for hop in hops)
+                self._fields[field] = last
+            self.ordering.append('-' + field if descending else field)
+        if 'pk' not in [name.lstrip('-') for name in self.ordering]:
+            self.ordering.append('pk')
+
+    def page(self, cursor=None):
+        """
+        Get the page after (or before, for a `previous_cursor`) the row a cursor points at
+
+        :param cursor: Cursor from a previous `KeysetPage`, None for the first page
+        :type cursor: str
+        :returns KeysetPage:
+        :raises InvalidCursor: For cursors that can't be decoded or were made for another query or ordering
+        """
+        fingerprint = self.form.query_fingerprint()
+        queryset = self.form.process(self.data_set)
+
+        backwards = False
+        if cursor:
+            direction, values = self._decode(cursor, fingerprint)
+            backwards = direction == 'previous'
+            queryset = queryset.filter(self._seek_filter(values, backwards))
+
+        relations = [name.lstrip('-').rsplit('__', 1)[0] for name in self.ordering if '__' in name]
+        if relations:
+            queryset = queryset.select_related(*relations)
+        rows = list(queryset.order_by(*self._order_by(backwards))[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        if backwards:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = self._encode('next', rows[-1], fingerprint)
+        if rows and has_previous:
+            previous_cursor = self._encode('previous', rows[0], fingerprint)
+        return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor)
+
+    def _order_by(self, backwards):
+        """
+        :returns list: `order_by()` arguments, nullable fields sort their NULLs as the smallest value
+        """
+        order_by = []
+        for name in self.ordering:
+            field = name.lstrip('-')
+            descending = name.startswith('-') != backwards
+            if self._nullable.get(field):
+                order_by.append(F(field).desc(nulls_last=True) if descending else F(field).asc(nulls_first=True))
+            else:
+                order_by.append('-' + field if descending else field)
+        return order_by
+
+    def _seek_filter(self, values, backwards):
+        """
+        (a > va) OR (a = va AND b > vb) OR ... for the ordering fields, with < for descending fields
+        (and the other way around going backwards). NULL is smaller than every value
+        """
+        seek = []
+        equal = Q()
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-') != backwards
+            if value is None:
+                past = None if descending else Q(**{'%s__isnull' % field: False})
+                same = Q(**{'%s__isnull' % field: True})
+            else:
+                past = Q(**{'%s__%s' % (field, 'lt' if descending else 'gt'): value})
+                if descending and self._nullable.get(field):
+                    past |= Q(**{'%s__isnull' % field: True})
+                same = Q(**{field: value})
+            if past is not None:
+                seek.append(equal & past)
+            equal &= same
+        return reduce(operator.or_, seek)
+
+    def _get_values(self, row):
+        """
+        :returns list: The ordering values of a row, foreign keys as their raw value
+        """
+        values = []
+        for name in self.ordering:
+            name = name.lstrip('-')
+            if name == 'pk':
+                values.append(row.pk)
+                continue
+            value = row
+            hops = compile_path(self.form.model, name)
+            for index, hop in enumerate(hops):
+                if value is None:
+                    break
+                if not hop.field.concrete:  # reverse one to one
+                    try:
+                        value = getattr(value, hop.field.get_accessor_name())
+                    except ObjectDoesNotExist:
+                        value = None
+                elif index == len(hops) - 1:
+                    value = getattr(value, hop.field.attname)
+                else:
+                    value = getattr(value, hop.field.name)
+            values.append(value)
+        return values
+
+    def _encode(self, direction, row, fingerprint):
+        data = json.dumps([fingerprint, self.ordering, direction, self._get_values(row)],
+                          cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def _decode(self, cursor, fingerprint):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            cursor_fingerprint, ordering, direction, values = json.loads(
+                base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+            )
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise InvalidCursor("The cursor can't be decoded")
+        if cursor_fingerprint != fingerprint or ordering != self.ordering:
+            raise InvalidCursor("The cursor was made for another query or ordering")
+        if direction not in ('next', 'previous') or not isinstance(values, list) or \
+                len(values) != len(self.ordering):
+            raise InvalidCursor("The cursor can't be decoded")
+        try:
+            values = [self._to_query_value(name.lstrip('-'), value) for name, value in zip(self.ordering, values)]
+        except (TypeError, ValueError, ValidationError):
+            raise InvalidCursor("The cursor has invalid ordering values")
+        return direction, values
+
+    def _to_query_value(self, name, value):
+        """
+        Convert a value read from a cursor with the ordering field, cursors are not signed
+        """
+        if value is None:
+            return None
+        field = self._fields[name]
+        return field.get_prep_value(field.to_python(value))
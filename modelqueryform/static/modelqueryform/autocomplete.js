@@ -0,0 +1,52 @@
+(function () {
+    "use strict";
+
+    function attach(select) {
+        var url = select.getAttribute("data-autocomplete-url");
+        var search = document.createElement("input");
+        var more = document.createElement("button");
+        var after = null;
+        var timer = null;
+
+        search.type = "search";
+        more.type = "button";
+        more.textContent = "More";
+        more.style.display = "none";
+        select.parentNode.insertBefore(search, select);
+        select.parentNode.insertBefore(more, select.nextSibling);
+
+        function load(reset) {
+            var params = "?q=" + encodeURIComponent(search.value);
+            if (!reset && after !== null) {
+                params += "&after=" + encodeURIComponent(after);
+            }
+            fetch(url + params, {credentials: "same-origin"}).then(function (response) {
+                return response.json();
+            }).then(function (page) {
+                Array.prototype.slice.call(select.options).forEach(function (option) {
+                    if (reset && !option.selected) {
+                        select.removeChild(option);
+                    }
+                });
+                page.results.forEach(function (result) {
+                    if (!select.querySelector('option[value="' + result.id + '"]')) {
+                        select.appendChild(new Option(result.text, result.id));
+                    }
+                });
+                after = page.next;
+                more.style.display = after === null ? "none" : "";
+            });
+        }
+
+        search.addEventListener("input", function () {
+            clearTimeout(timer);
+            timer = setTimeout(function () { load(true); }, 250);
+        });
+        more.addEventListener("click", function () { load(false); });
+        load(true);
+    }
+
+    document.addEventListener("DOMContentLoaded", function () {
+        Array.prototype.forEach.call(document.querySelectorAll("select[data-autocomplete-url]"), attach);
+    });
+})();
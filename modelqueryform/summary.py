@@ -0,0 +1,166 @@
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.aggregates import Max
+
+from .models import FieldSummary
+from .utils import _get_range_bound_aggregates, _get_range_bounds_from_results
+
+
+def refresh_summaries(model, bounds_paths=(), distinct_paths=(), incremental=False):
+    """
+    Compute and store the `FieldSummary` rows of `model`
+
+    A full refresh aggregates every row. An incremental refresh only reads the rows with a pk past the `last_pk`
+    of each summary and widens the stored bounds / adds the new distinct values, so it picks up inserted rows
+    but not updates or deletes (run a full refresh for those). Paths without a summary are always fully refreshed.
+
+    :param model: Model to summarize
+    :type model: django.db.models.Model
+    :param bounds_paths: orm field names to store (min, max) for
+    :type bounds_paths: iterable
+    :param distinct_paths: orm field names to store the distinct values of
+    :type distinct_paths: iterable
+    :param incremental: Only read rows added since the last refresh
+    :type incremental: bool
+    :returns list: The saved [FieldSummary,...]
+    """
+    bounds_paths = list(bounds_paths)
+    distinct_paths = list(distinct_paths)
+    paths = sorted(set(bounds_paths + distinct_paths))
+    if not paths:
+        return []
+
+    label = model._meta.label
+    existing = dict((summary.path, summary)
+                    for summary in FieldSummary.objects.filter(model=label, path__in=paths))
+    last_pk = model._default_manager.aggregate(last_pk=Max('pk'))['last_pk']
+
+    # Group the paths by the pk they were summarized to so each group is one aggregate query
+    groups = {}
+    for path in paths:
+        summary = existing.get(path)
+        after = json.loads(summary.last_pk) if incremental and summary and summary.last_pk else None
+        if after is not None and (summary.bounds is None and path in bounds_paths or
+                                  summary.distinct_values is None and path in distinct_paths):
+            after = None
+        groups.setdefault(after, []).append(path)
+
+    saved = []
+    with transaction.atomic():
+        for after, group in groups.items():
+            queryset = model._default_manager.all()
+            if last_pk is not None:
+                queryset = queryset.filter(pk__lte=last_pk)
+            if after is not None:
+                queryset = queryset.filter(pk__gt=after)
+
+            group_bounds = [path for path in group if path in bounds_paths]
+            bounds = {}
+            if group_bounds:
+                bounds = _get_range_bounds_from_results(
+                    group_bounds, queryset.aggregate(*_get_range_bound_aggregates(group_bounds))
+                )
+
+            for path in group:
+                summary = existing.get(path) or FieldSummary(model=label, path=path)
+                if path in bounds:
+                    path_bounds = _load(_dump(bounds[path]))
+                    if after is not None:
+                        path_bounds = _widen(_load(summary.bounds), path_bounds)
+                    summary.bounds = _dump(path_bounds)
+                if path in distinct_paths:
+                    values = _load(_dump(list(queryset.order_by(path).values_list(path, flat=True).distinct())))
+                    if after is not None:
+                        values = _merge(_load(summary.distinct_values), values)
+                    summary.distinct_values = _dump(values)
+                summary.last_pk = _dump(last_pk)
+                summary.save()
+                saved.append(summary)
+    return saved
+
+
+def refresh_form_summaries(form_class, incremental=False):
+    """
+    Refresh the summaries a ModelQueryForm reads: the bounds of its default `RangeField` paths and the
+    distinct values of its `summary_distinct_fields`
+
+    :param form_class: ModelQueryForm subclass
+    :param incremental: See :func:`refresh_summaries`
+    :returns list: The saved [FieldSummary,...]
+    """
+    specs = form_class(defer_build=True)._get_resolved_field_specs()
+    return refresh_summaries(form_class.model,
+                             [spec.name for spec in specs if spec.builder == '_build_range_field'],
+                             form_class.summary_distinct_fields,
+                             incremental)
+
+
+def get_summary_bounds(model, paths):
+    """
+    Read stored bounds with a single indexed query
+
+    :param model: Summarized model
+    :param paths: orm field names
+    :returns dict: {path: (min, max),...} for the paths that have summarized bounds
+    """
+    if not paths:
+        return {}
+    rows = FieldSummary.objects.filter(model=model._meta.label, path__in=list(paths),
+                                       bounds__isnull=False).values_list('path', 'bounds')
+    return dict((path, tuple(_load(bounds))) for path, bounds in rows)
+
+
+def get_summary_choices(model, path):
+    """
+    Read stored distinct values as choices
+
+    :param model: Summarized model
+    :param path: orm field name
+    :returns list: [[value, value],...] like `get_choices_from_distinct`, None without a summary
+    """
+    rows = FieldSummary.objects.filter(model=model._meta.label, path=path,
+                                       distinct_values__isnull=False).values_list('distinct_values', flat=True)
+    for values in rows:
+        return [[value, value] for value in _load(values)]
+    return None
+
+
+def _widen(stored, bounds):
+    values = [value for value in list(stored) + list(bounds) if value is not None]
+    if not values:
+        return [None, None]
+    return [min(values, key=_sort_key), max(values, key=_sort_key)]
+
+
+def _merge(stored, values):
+    """
+    Add the new distinct values to the stored ones, keeping them sorted like ORDER BY would
+    """
+    merged = list(stored)
+    seen = set(merged)
+    merged += [value for value in values if value not in seen]
+    return sorted(merged, key=_sort_key)
+
+
+def _sort_key(value):
+    # Stored values went through JSON, Decimals are strings so compare them as numbers
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    try:
+        return (2, float(value))
+    except (TypeError, ValueError):
+        return (3, value)
+
+
+def _dump(value):
+    return json.dumps(value, cls=DjangoJSONEncoder)
+
+
+def _load(value):
+    return json.loads(value) if value is not None else None
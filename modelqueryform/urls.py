@@ -0,0 +1,9 @@
+from django.conf.urls import url
+
+from .views import AutocompleteView
+
+app_name = 'modelqueryform'
+
+urlpatterns = [
+    url(r'^autocomplete/(?P<form>[\w.]+)/(?P<field>\w+)/$', AutocompleteView.as_view(), name='autocomplete'),
+]
@@ -1,5 +1,12 @@
+import datetime
+import decimal
+import json
 import operator
+from collections import namedtuple
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Manager, Model, QuerySet
+from django.db.models.aggregates import Min, Max
 from django.db.models.query_utils import Q
 from django.forms.fields import MultipleChoiceField
 from django.forms.widgets import CheckboxSelectMultiple
@@ -10,36 +17,223 @@ except ImportError:  # Python < 3
     pass
 
 
+PathHop = namedtuple('PathHop', ['model', 'field', 'is_to_many'])
+PathHop.__doc__ = """
+One step of a compiled orm path
+
+:ivar model: Model the field is looked up on
+:ivar field: Field (or reverse relation) named by the step
+:ivar bool is_to_many: True if the step follows a many valued relation (ManyToMany or reverse ForeignKey)
+"""
+
+_compiled_paths = {}
+
+
+def compile_path(model, field_name):
+    '''
+    Resolve an orm relational representation 'relation__relation__field_name' into a tuple of `PathHop`.
+    Results are cached per (model, field_name)
+
+    :raises FieldDoesNotExist: If a step of the path does not exist or a step other than the last
+        is not a relation
+    '''
+    key = (model, field_name)
+    hops = _compiled_paths.get(key)
+    if hops is None:
+        hops = []
+        current = model
+        for jump in field_name.split("__"):
+            if current is None:
+                raise FieldDoesNotExist("%s can't be traversed, %s is not a relation"
+                                        % (field_name, hops[-1].field.name))
+            field = current._meta.get_field(jump)
+            hops.append(PathHop(current, field, bool(field.many_to_many or field.one_to_many)))
+            current = field.related_model
+        hops = tuple(hops)
+        _compiled_paths[key] = hops
+    return hops
+
+
+def path_is_to_many(hops):
+    '''
+    :returns bool: True if any step of a compiled path follows a many valued relation
+    '''
+    return any(hop.is_to_many for hop in hops)
+
+
 def traverse_related_to_field(field_name, model):
     '''
     Given an orm relational representation 'relational_field__field_name' and the base model of
     the relation, return the actual terminal Field
     '''
-    jumps = field_name.split("__")
-    if len(jumps) is 1:
-        return model._meta.get_field(field_name)
-    else:
-        return traverse_related_to_field("__".join(jumps[1:]),
-                                         model._meta.get_field(jumps[:1][0]).related_model
-                                         )
+    return compile_path(model, field_name)[-1].field
+
+
+def get_path_models(field_name, model):
+    '''
+    Given an orm relational representation 'relational_field__field_name' and the base model of
+    the relation, return every model whose data the path reads (including many to many through models)
+    '''
+    models = [model]
+    hops = compile_path(model, field_name)
+    for index, hop in enumerate(hops):
+        field = hop.field
+        through = getattr(field, 'through', None) or getattr(field.remote_field, 'through', None)
+        if field.many_to_many and through is not None:
+            models.append(through)
+        if index < len(hops) - 1:
+            models.append(field.related_model)
+    return models
 
 
-def get_choices_from_distinct(model, field):
+def get_choices_from_distinct(model, field, cache=None):
     """Generate a list of choices from a distinct() call.
 
     :param model: Model to use
     :type model: django.db.models.Model
     :param field: Field whose .distinct values you want
     :type field: django Model Field
+    :param cache: Cache to keep the choices in
+    :type cache: `modelqueryform.cache.FormCache`
     :returns: list -- the distinct values of the field in the model
     """
+    def compute():
+        return [[x, x] for x in model.objects.distinct().order_by(field).values_list(field, flat=True)]
 
-    choices = [[x, x] for x in model.objects.distinct().order_by(field).values_list(field, flat=True)]
+    if cache is None:
+        return compute()
+    return cache.get_or_set(('distinct', model._meta.label, field),
+                            get_path_models(field, model),
+                            compute)
 
-    return choices
 
+def estimate_cardinality(model, field, limit, cache=None):
+    """Count the values a (possibly traversed) field can have, stopping at `limit` + 1
 
-def get_range_field(model, field, name):
+    Relations count the rows of the related model, other fields their distinct values.
+    The count runs with a LIMIT so its cost stays bounded however large the table is.
+
+    :param model: Model to use
+    :type model: django.db.models.Model
+    :param field: orm field name
+    :type field: string
+    :param limit: Counts above this are reported as `limit` + 1
+    :type limit: int
+    :param cache: Cache to keep the estimate in
+    :type cache: `modelqueryform.cache.FormCache`
+    :returns: int -- min(number of values, limit + 1)
+    """
+    model_field = traverse_related_to_field(field, model)
+
+    def compute():
+        if model_field.is_relation:
+            queryset = model_field.related_model._default_manager.values('pk')
+        else:
+            queryset = model._default_manager.order_by().values_list(field).distinct()
+        return queryset[:limit + 1].count()
+
+    if cache is None:
+        return compute()
+    models = get_path_models(field, model)
+    if model_field.is_relation:
+        models.append(model_field.related_model)
+    return cache.get_or_set(('cardinality', model._meta.label, field, limit), models, compute)
+
+
+def iterate_in_chunks(queryset, chunk_size):
+    """Iterate a QuerySet without caching it, fetching `chunk_size` rows at a time
+
+    :param queryset: QuerySet to iterate
+    :type queryset: django.db.models.QuerySet
+    :param chunk_size: Rows fetched from the database cursor at a time
+    :type chunk_size: int
+    :returns: iterator
+    """
+    try:
+        return queryset.iterator(chunk_size=chunk_size)
+    except TypeError:  # Django < 2.0
+        return queryset.iterator()
+
+
+def get_choices_from_values(model, label='pk', chunk_size=2000):
+    """Generate choices from a values_list() call, never loading model instances
+
+    :param model: Model to use
+    :type model: django.db.models.Model
+    :param label: Field name or expression used as the choice label
+    :type label: string or django.db.models.Expression
+    :param chunk_size: Rows fetched from the database cursor at a time
+    :type chunk_size: int
+    :returns: tuple -- ((pk, str(label)),...)
+    """
+    queryset = model.objects.values_list('pk', label)
+    return tuple((pk, "%s" % value) for pk, value in iterate_in_chunks(queryset, chunk_size))
+
+
+def get_autocomplete_page(model, label='pk', search_lookups=None, query='', after=None, page_size=20):
+    """Get one page of (pk, label) choices using keyset pagination on pk
+
+    :param model: Model or QuerySet to page through
+    :type model: django.db.models.Model or QuerySet
+    :param label: Field name or expression used as the choice label
+    :type label: string or django.db.models.Expression
+    :param search_lookups: orm lookups OR'd together to match `query` eg. ['name__icontains']
+    :type search_lookups: list
+    :param query: Search text, ignored when empty
+    :type query: string
+    :param after: Only return pks greater than this (the last pk of the previous page)
+    :param page_size: Maximum number of choices returned
+    :type page_size: int
+    :returns: tuple -- (((pk, str(label)),...), pk to pass as `after` for the next page or None)
+    :raises ValueError: If `after` is not a valid pk
+    """
+    queryset = model.all() if isinstance(model, (QuerySet, Manager)) else model.objects.all()
+    if query and search_lookups:
+        queryset = queryset.filter(reduce(operator.or_,
+                                          [Q(**{lookup: query}) for lookup in search_lookups]
+                                          )
+                                   )
+    if after not in (None, ''):
+        try:
+            queryset = queryset.filter(pk__gt=after)
+        except ValidationError as e:
+            raise ValueError(e)
+
+    rows = list(queryset.order_by('pk').values_list('pk', label)[:page_size + 1])
+    choices = tuple((pk, "%s" % value) for pk, value in rows[:page_size])
+    next_after = choices[-1][0] if len(rows) > page_size else None
+    return choices, next_after
+
+
+def get_range_bounds(model, fields):
+    """Get the min and max of several (possibly traversed) fields with a single aggregate query
+
+    :param model: Model to aggregate over
+    :type model: django.db.models.Model
+    :param fields: orm field names
+    :type fields: list
+    :returns: dict -- {field name: (min, max),...}
+    """
+    if not fields:
+        return {}
+
+    results = model.objects.all().aggregate(*_get_range_bound_aggregates(fields))
+    return _get_range_bounds_from_results(fields, results)
+
+
+def _get_range_bound_aggregates(fields):
+    aggregates = []
+    for field in fields:
+        aggregates += [Min(field), Max(field)]
+    return aggregates
+
+
+def _get_range_bounds_from_results(fields, results):
+    return dict((field, (results[field + "__min"], results[field + "__max"]))
+                for field in fields)
+
+
+def get_range_field(model, field, name, bounds=None):
     '''Generate a RangeField form element
 
     :param model: Model to generate a form element for
@@ -48,6 +242,8 @@ def get_range_field(model, field, name):
     :type field: django model field
     :param name: Name to use for the form field
     :param name: string
+    :param bounds: Precomputed (min, max) for the field, queried when None
+    :type bounds: tuple
     :returns: `RangeField`
 
     '''
@@ -55,7 +251,8 @@ def get_range_field(model, field, name):
     return RangeField(label=field.verbose_name,
                       required=False,
                       model=model,
-                      field=name)
+                      field=name,
+                      bounds=bounds)
 
 
 def get_multiplechoice_field(field, choices):
@@ -87,7 +284,7 @@ def get_range_field_filter(field, values):
     :type field: string
     :param values: `RangeField` values dict
     :type values: dict
-    :returns: Q -- AND(OR(field__gte: min, field__lte: max),(field__isnull: allow_empty)
+    :returns: Q -- OR(field__range: (min, max), field__isnull: allow_empty)
     """
 
     filters = []
@@ -95,12 +292,7 @@ def get_range_field_filter(field, values):
         range_min = values['min']
         range_max = values['max']
         if not range_min == range_max:
-            filters.append(reduce(operator.and_,
-                                  [Q(**{field + '__gte': range_min}),
-                                   Q(**{field + '__lte': range_max}),
-                                   ]
-                                  )
-                           )
+            filters.append(Q(**{field + '__range': (range_min, range_max)}))
         else:
             filters.append(Q(**{field: range_min}))
 
@@ -112,18 +304,95 @@ def get_range_field_filter(field, values):
         return None
 
 
-def get_multiplechoice_field_filter(field, values):
+def get_multiplechoice_field_filter(field, values, null_choice=False):
     """Generate a model filter from a POSTed MultipleChoiceField
 
     :param field: orm field name
     :type field: string
     :param values: Selected values
     :type values: list
-    :returns: Q -- (OR(field: value),...)
+    :param null_choice: The form field has a None choice, so a posted 'None' means None
+    :type null_choice: bool
+    :returns: Q -- OR(field__in: values, field__isnull: True if None in values)
+
+    .. note:: MultipleChoiceField posts a None choice as 'None', with `null_choice` both are filtered with `__isnull`
     """
     try:
-        return reduce(operator.or_,
-                      [Q(**{field: value}) for value in values]
-                      )
-    except:
+        selected = []
+        include_null = False
+        for value in values:
+            if value is None or null_choice and value == 'None':
+                include_null = True
+            elif value not in selected:
+                selected.append(value)
+    except TypeError:
         return None
+
+    filters = []
+    if len(selected) == 1:
+        filters.append(Q(**{field: selected[0]}))
+    elif selected:
+        filters.append(Q(**{field + '__in': selected}))
+    if include_null:
+        filters.append(Q(**{field + '__isnull': True}))
+
+    if not filters:
+        return None
+    return reduce(operator.or_, filters)
+
+
+def flatten_q(q_objects, connector=Q.AND):
+    """Combine Q objects with `connector`, flattening nested Q objects that use the same connector
+    and dropping duplicate conditions
+
+    :param q_objects: Q objects to combine
+    :type q_objects: iterable
+    :param connector: Q.AND or Q.OR
+    :type connector: string
+    :returns: Q
+    """
+    children = []
+
+    def add(child):
+        if isinstance(child, Q) and not child.negated and (child.connector == connector or len(child) == 1):
+            for grandchild in child.children:
+                add(grandchild)
+        elif child not in children:
+            children.append(child)
+
+    for q_object in q_objects:
+        add(q_object)
+
+    return Q(*children, _connector=connector)
+
+
+def canonical_value(value):
+    """Convert a cleaned form value into a JSON serializable value that doesn't depend on its python type,
+    labels or ordering
+
+    * numbers (int, float, Decimal) become their shortest decimal string, so 12, 12.0 and Decimal('12.00') match
+    * lists, tuples and sets are deduplicated and sorted
+    * dicts keep their keys with canonical values
+    * dates and times become ISO 8601 strings, model instances their pk
+
+    :param value: Cleaned value
+    :returns: Canonical value
+    """
+    if value is None or isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, decimal.Decimal)):
+        return '{:f}'.format(decimal.Decimal(str(value)).normalize())
+    if isinstance(value, dict):
+        return dict(("%s" % key, canonical_value(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        items = [canonical_value(item) for item in value]
+        unique = []
+        for item in items:
+            if item not in unique:
+                unique.append(item)
+        return sorted(unique, key=lambda item: json.dumps(item, sort_keys=True))
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, Model):
+        return canonical_value(value.pk)
+    return "%s" % value
@@ -0,0 +1,112 @@
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseBadRequest, JsonResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.generic import View
+
+from .forms import form_registry
+from .utils import traverse_related_to_field, get_autocomplete_page
+
+
+class AutocompleteView(View):
+    """
+    Serve pages of choices for a field in `ModelQueryForm.autocomplete_fields`
+    (or made an `AutocompleteField` by `widget_policy`)
+
+    GET parameters:
+
+    * `q`: search text
+    * `after`: `next` from the previous page
+
+    Only authenticated users are served, override :meth:`has_permission` and :meth:`get_queryset`
+    to restrict who can search which rows. Restrictions that also apply to the submitted pks belong in
+    `ModelQueryForm.get_autocomplete_queryset`, which :meth:`get_queryset` starts from.
+
+    :returns JsonResponse: {"results": [{"id": pk, "text": label},...], "next": pk or null}
+    :raises Http404: If the form is unknown or the field isn't one of its autocomplete fields
+    :raises PermissionDenied: If :meth:`has_permission` is False
+    """
+    page_size = 20
+
+    def get(self, request, form, field):
+        form_class = form_registry.get(form)
+        if form_class is None or field not in self.get_autocomplete_fields(form_class):
+            raise Http404("No autocomplete field %s on %s" % (field, form))
+        if not self.has_permission(request, form_class, field):
+            raise PermissionDenied
+
+        model_field = traverse_related_to_field(field, form_class.model)
+        label = form_class.related_choice_labels.get(model_field.name, 'pk')
+        search_lookups = form_class.autocomplete_search_fields.get(field)
+        if search_lookups is None:
+            search_lookups = ['%s__icontains' % label] if isinstance(label, str) else []
+
+        try:
+            choices, next_after = get_autocomplete_page(self.get_queryset(request, form_class, field),
+                                                        label=label,
+                                                        search_lookups=search_lookups,
+                                                        query=request.GET.get('q', ''),
+                                                        after=request.GET.get('after'),
+                                                        page_size=self.page_size)
+        except ValueError:
+            return HttpResponseBadRequest("Invalid after")
+
+        return JsonResponse({'results': [{'id': pk, 'text': text} for pk, text in choices],
+                             'next': next_after})
+
+    def has_permission(self, request, form_class, field):
+        """
+        :param request: HttpRequest
+        :param form_class: ModelQueryForm subclass
+        :param field: Autocomplete field name
+        :returns bool: If the request may page through the choices of `field`, defaults to authenticated users
+        """
+        user = getattr(request, 'user', None)
+        return user is not None and user.is_authenticated
+
+    def get_queryset(self, request, form_class, field):
+        """
+        :param request: HttpRequest
+        :param form_class: ModelQueryForm subclass
+        :param field: Autocomplete field name
+        :returns QuerySet: Related rows the request may see, defaults to
+            `form_class.get_autocomplete_queryset()`, the rows the form accepts
+        """
+        return form_class.get_autocomplete_queryset(traverse_related_to_field(field, form_class.model), field)
+
+    def get_autocomplete_fields(self, form_class):
+        """
+        :returns list: Names of the `include` fields of `form_class` built as an `AutocompleteField`
+        """
+        if form_class.widget_policy:
+            specs = form_class(defer_build=True)._get_resolved_field_specs()
+            return [spec.name for spec in specs if spec.builder == '_build_autocomplete_field']
+        return form_class.autocomplete_fields
+
+
+def conditional_query_response(request, form, respond):
+    """
+    Answer a repeated search with `304 Not Modified` when the client's `If-None-Match` has the form's
+    :meth:`ModelQueryForm.query_etag`, without calling `respond` (and so without running `process()`)::
+
+        def search(request):
+            query_form = MyModelQueryForm.from_query(request.GET.get('q', ''))
+            return conditional_query_response(request, query_form,
+                                              lambda form: render(request, 'results.html',
+                                                                  {'rows': form.process()}))
+
+    :param request: HttpRequest
+    :param form: Bound ModelQueryForm (validated here)
+    :param respond: Callable taking the form and returning an HttpResponse
+    :returns HttpResponse: `respond(form)` with an ETag header, or a 304. Invalid forms always get `respond(form)`
+    :raises ImproperlyConfigured: If the form has neither `result_cache` nor `cache`
+    """
+    if not form.is_valid():
+        return respond(form)
+
+    etag = quote_etag(form.query_etag())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = respond(form)
+    response['ETag'] = etag
+    return response
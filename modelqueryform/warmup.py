@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+
+from django.core.signals import request_started
+from django.db import DatabaseError, connections
+from django.utils.module_loading import autodiscover_modules
+
+from .forms import form_registry
+
+logger = logging.getLogger('modelqueryform')
+
+
+def get_warm_up_forms():
+    """
+    Import the forms module of every installed app and get the registered forms with `warm_up` set
+
+    :returns list: [form class,...] sorted by `get_form_key()`
+    """
+    autodiscover_modules('forms')
+    return [form_registry[key] for key in sorted(form_registry) if form_registry[key].warm_up]
+
+
+def warm_up_form(form_class):
+    """
+    Do the work the first instance of a form would do: compile its field specs and field hooks and,
+    when it has a `cache`, build it once so the range bounds and related choices are cached
+
+    :param form_class: ModelQueryForm subclass
+    """
+    form = form_class(defer_build=True)
+    for spec in form._get_field_specs():
+        form._get_field_hooks(spec.name)
+    if form.cache is not None:
+        form.build()
+
+
+def warm_up_forms(form_classes=None, background=False):
+    """
+    Warm up forms, logging the time each one took to the 'modelqueryform' logger
+
+    Errors are logged and skip the form, so warming up never breaks startup
+    (eg. when the tables aren't migrated yet)
+
+    :param form_classes: Forms to warm up, defaults to :func:`get_warm_up_forms`
+    :type form_classes: iterable
+    :param background: Run in a daemon thread and return it instead of blocking
+    :type background: bool
+    :returns: The started `threading.Thread` with `background`, else None
+    """
+    if form_classes is None:
+        form_classes = get_warm_up_forms()
+    form_classes = list(form_classes)
+
+    if background:
+        thread = threading.Thread(target=_warm_up, args=(form_classes, True), name='modelqueryform-warm-up')
+        thread.daemon = True
+        thread.start()
+        return thread
+    _warm_up(form_classes, False)
+
+
+def warm_up_on_first_request(sender, **kwargs):
+    """
+    `request_started` receiver connected by the app config for `settings.MODELQUERYFORM_WARM_UP`,
+    warms up the forms once, in the background, and disconnects itself
+
+    :returns: The started `threading.Thread`, or None after the first request
+    """
+    if request_started.disconnect(dispatch_uid='modelqueryform-warm-up'):
+        return warm_up_forms(background=True)
+
+
+def _warm_up(form_classes, close_connections):
+    try:
+        for form_class in form_classes:
+            start = time.perf_counter()
+            try:
+                warm_up_form(form_class)
+            except DatabaseError as e:
+                logger.warning("Can't warm up %s: %s", form_class.get_form_key(), e)
+                continue
+            except Exception:
+                logger.exception("Can't warm up %s", form_class.get_form_key())
+                continue
+            logger.info("Warmed up %s in %.3fs", form_class.get_form_key(), time.perf_counter() - start)
+    finally:
+        if close_connections:
+            connections.close_all()
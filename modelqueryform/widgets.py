@@ -1,10 +1,9 @@
 from django.core.exceptions import ValidationError
-from django.db.models.aggregates import Min, Max
-from django.forms.fields import Field
-from django.forms.widgets import MultiWidget, CheckboxInput, NumberInput
+from django.forms.fields import Field, MultipleChoiceField
+from django.forms.widgets import MultiWidget, CheckboxInput, NumberInput, SelectMultiple
 from django.utils.safestring import mark_safe
 
-from .utils import traverse_related_to_field
+from .utils import traverse_related_to_field, get_range_bounds
 
 
 class RangeWidget(MultiWidget):
@@ -60,8 +59,10 @@ class RangeWidget(MultiWidget):
 
 class RangeField(Field):
     def __init__(self, model, field, *args, **kwargs):
-        range_min = model.objects.all().aggregate(Min(field))[field + "__min"]
-        range_max = model.objects.all().aggregate(Max(field))[field + "__max"]
+        bounds = kwargs.pop('bounds', None)
+        if bounds is None:
+            bounds = get_range_bounds(model, [field])[field]
+        range_min, range_max = bounds
         super(RangeField, self).__init__(*args, **kwargs)
         self.widget = RangeWidget(allow_null=traverse_related_to_field(field, model).null,
                                   attrs={'min': range_min, 'max': range_max})
@@ -85,3 +86,56 @@ class RangeField(Field):
         if value:
             if value['min'] > value['max']:
                 raise ValidationError('Min must be less than or equal to Max')
+
+
+class AutocompleteWidget(SelectMultiple):
+    '''
+    SelectMultiple that only renders the selected options.
+    Other options are loaded from `url` (see :class:`modelqueryform.views.AutocompleteView`)
+    by modelqueryform/autocomplete.js
+    '''
+    class Media:
+        js = ('modelqueryform/autocomplete.js',)
+
+    def __init__(self, url=None, attrs=None):
+        self.url = url
+        super(AutocompleteWidget, self).__init__(attrs)
+
+    def get_context(self, name, value, attrs):
+        context = super(AutocompleteWidget, self).get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = self.url
+        return context
+
+
+class AutocompleteField(MultipleChoiceField):
+    '''
+    MultipleChoiceField for relations with too many rows to render.
+    Only the submitted pks are looked up in `queryset`, in a single query, to validate and label them.
+    '''
+    widget = AutocompleteWidget
+
+    def __init__(self, queryset, label_field='pk', url=None, *args, **kwargs):
+        super(AutocompleteField, self).__init__(*args, **kwargs)
+        self.queryset = queryset
+        self.label_field = label_field
+        self.widget.url = url
+
+    def get_submitted_choices(self, value):
+        try:
+            return [(pk, "%s" % label) for pk, label in
+                    self.queryset.filter(pk__in=value).values_list('pk', self.label_field)]
+        except (ValueError, TypeError, ValidationError):
+            return []
+
+    def validate(self, value):
+        if self.required and not value:
+            raise ValidationError(self.error_messages['required'], code='required')
+        self.choices = self.get_submitted_choices(value) if value else []
+        found = set("%s" % pk for pk, label in self.choices)
+        for val in value:
+            if val not in found:
+                raise ValidationError(
+                    self.error_messages['invalid_choice'],
+                    code='invalid_choice',
+                    params={'value': val},
+                )
@@ -25,6 +25,9 @@ setup(
     url='https://github.com/ckirby/django-modelqueryform',
     packages=[
         'modelqueryform',
+        'modelqueryform.management',
+        'modelqueryform.management.commands',
+        'modelqueryform.migrations',
     ],
     include_package_data=True,
     install_requires=[
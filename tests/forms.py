@@ -1,8 +1,9 @@
 from django.db.models.query_utils import Q
 from django.forms import CharField, Field, IntegerField
 
+from modelqueryform.cache import FormCache
 from modelqueryform.forms import ModelQueryForm
-from .models import BaseModelForTest
+from .models import BaseModelForTest, RelatedModelForTest
 
 
 class NoModelForm(ModelQueryForm):
@@ -75,3 +76,71 @@ class GoodTraverseForm(ModelQueryForm):
 class RelatedAsChoicesForm(ModelQueryForm):
     model = BaseModelForTest
     include = ['foreign_related']
+
+
+class CachedTraverseForm(GoodTraverseForm):
+    include = GoodTraverseForm.include + ['foreign_related']
+    cache = FormCache()
+
+
+class RelatedValuesChoicesForm(ModelQueryForm):
+    model = BaseModelForTest
+    include = ['foreign_related', 'many_related']
+    related_choice_labels = {'foreign_related': 'related_type'}
+
+
+class AutocompleteForm(ModelQueryForm):
+    model = BaseModelForTest
+    include = ['foreign_related', 'many_related']
+    autocomplete_fields = ['foreign_related', 'many_related']
+    related_choice_labels = {'foreign_related': 'related_type'}
+
+
+class RestrictedAutocompleteForm(AutocompleteForm):
+    @classmethod
+    def get_autocomplete_queryset(cls, model_field, name):
+        return model_field.related_model.objects.filter(related_type__in=[1, 21])
+
+
+class ExplainForm(FormTest):
+    explain_queries = True
+
+
+class ResultCachedTraverseForm(GoodTraverseForm):
+    result_cache = FormCache()
+
+
+class ReverseTraverseForm(ModelQueryForm):
+    model = RelatedModelForTest
+    include = ['related_type', 'foreigns__integer', 'ones__float']
+    display_fields = {'foreigns': ['integer'], 'manys__foreign_related': ['related_type']}
+
+
+class TwoHopDisplayForm(ModelQueryForm):
+    model = RelatedModelForTest
+    include = ['related_type']
+    display_fields = {'manys': ['integer'], 'manys__foreign_related': ['related_type']}
+
+
+class SemijoinTraverseForm(GoodTraverseForm):
+    include = GoodTraverseForm.include + ['many_related']
+    to_many_filter = 'semijoin'
+    to_many_filters = {'many_related': 'join'}
+
+
+class SummaryTraverseForm(GoodTraverseForm):
+    use_summaries = True
+    summary_distinct_fields = ['integer', 'foreign_related__related_type']
+
+
+class WarmUpForm(CachedTraverseForm):
+    cache = FormCache()
+    warm_up = True
+
+
+class WidgetPolicyForm(ModelQueryForm):
+    model = BaseModelForTest
+    include = ['integer', 'integer_with_choices', 'foreign_related', 'foreign_related__related_type']
+    widget_policy = True
+    max_checkbox_choices = 3
+    cache = FormCache()
@@ -25,6 +25,11 @@ class InheritBaseModelForTest(BaseModelForTest):
         return self.character
 
 
+class ProxyBaseModelForTest(BaseModelForTest):
+    class Meta:
+        proxy = True
+
+
 class RelatedModelForTest(models.Model):
     related_type = models.IntegerField()
 
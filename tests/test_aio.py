@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` aio module.
+"""
+
+import sys
+from unittest import skipIf
+
+from django.forms.fields import CharField
+from django.test import TestCase
+
+from tests.forms import GoodTraverseForm, RelatedAsChoicesForm, FormTestWithTextNamedMethod
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+try:
+    from asgiref.sync import async_to_sync
+except ImportError:
+    async_to_sync = None
+
+if sys.version_info >= (3, 6):
+    from modelqueryform.aio import AsyncModelQueryFormMixin
+
+    class AsyncTraverseForm(AsyncModelQueryFormMixin, GoodTraverseForm):
+        pass
+
+    class AsyncRelatedAsChoicesForm(AsyncModelQueryFormMixin, RelatedAsChoicesForm):
+        pass
+
+    class AsyncTextForm(AsyncModelQueryFormMixin, FormTestWithTextNamedMethod):
+        pass
+
+
+@skipIf(sys.version_info < (3, 6) or async_to_sync is None, "Needs Python 3.6+ and asgiref")
+class TestModelqueryformAio(TestCase):
+    def setUp(self):
+        for related_type in (1, 2, 6, 2):
+            RelatedModelForTest.objects.create(related_type=related_type)
+        for integer in (15, 11, 12, 19):
+            BaseModelForTest.objects.create(integer=integer, integer_with_choices=1, float=integer,
+                                            boolean=True, null_boolean=None, text="row %s" % integer)
+
+    def test_async_api(self):
+        form = async_to_sync(AsyncTraverseForm.acreate)({'integer_0': 12, 'integer_1': 19})
+        self.assertEqual(len(form.fields), 5, "acreate should build the fields")
+        self.assertEqual(form.fields['integer'].widget.widgets[0].attrs, {'min': 11, 'max': 19},
+                         "abuild should fetch the range bounds")
+        form.is_valid()
+        self.assertEqual(async_to_sync(form.acount)(), 3, "acount should count the filtered rows")
+
+        rows = []
+        iterator = form.aiter(chunk_size=2)
+        while True:
+            try:
+                rows.append(async_to_sync(iterator.__anext__)())
+            except StopAsyncIteration:
+                break
+        self.assertQuerysetEqual(form.process(), [repr(r) for r in rows], ordered=False)
+        self.assertEqual(async_to_sync(form.aprocess)(load_related=True).query.select_related,
+                         form.process(load_related=True).query.select_related,
+                         "aprocess should load the related rows like process")
+
+        form = async_to_sync(AsyncRelatedAsChoicesForm.acreate)()
+        self.assertEqual(len(form.fields['foreign_related'].choices), 4,
+                         "abuild should fetch the related choices")
+        form = async_to_sync(AsyncTextForm.acreate)()
+        self.assertIsInstance(form.fields['text'], CharField, "build hooks should run")
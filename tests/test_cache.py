@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` cache module.
+"""
+
+import time
+
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase
+
+from modelqueryform import utils
+from modelqueryform.cache import LRUCache, FormCache
+from modelqueryform.forms import ModelQueryForm, form_registry
+from tests.forms import CachedTraverseForm, ResultCachedTraverseForm
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+class TestModelqueryformCache(TestCase):
+    def setUp(self):
+        CachedTraverseForm.cache.clear()
+        self.related = RelatedModelForTest.objects.create(related_type=1)
+        self.base = BaseModelForTest.objects.create(integer=15,
+                                                    integer_with_choices=1,
+                                                    float=12.6,
+                                                    boolean=True,
+                                                    null_boolean=None,
+                                                    text="foo")
+
+    def test_lru(self):
+        lru = LRUCache(maxsize=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIsNone(lru.get('b'), "Least recently used entry should be evicted")
+        self.assertEqual(lru.get('a'), 1, "Recently used entry should be kept")
+        self.assertEqual(len(lru), 2, "Cache should not grow past maxsize")
+
+    def test_form_uses_cache(self):
+        CachedTraverseForm()
+        with self.assertNumQueries(0):
+            form = CachedTraverseForm()
+        self.assertEqual(form.fields['integer'].widget.widgets[0].attrs,
+                         {'min': 15, 'max': 15},
+                         "Cached bounds should be used")
+
+    def test_save_invalidates(self):
+        CachedTraverseForm()
+        RelatedModelForTest.objects.create(related_type=4)
+        with self.assertNumQueries(2):
+            form = CachedTraverseForm()
+        self.assertEqual(len(form.fields['foreign_related'].choices), 2,
+                         "Related choices should be refreshed after a save")
+
+        self.base.many_related.add(self.related)
+        with self.assertNumQueries(1):
+            CachedTraverseForm()
+
+        BaseModelForTest.objects.filter(pk=self.base.pk).delete()
+        with self.assertNumQueries(1):
+            form = CachedTraverseForm()
+        self.assertEqual(form.fields['integer'].widget.widgets[0].attrs,
+                         {'min': None, 'max': None},
+                         "Bounds should be refreshed after a delete")
+
+    def test_distinct_choices(self):
+        cache = FormCache()
+        utils.get_choices_from_distinct(BaseModelForTest, 'integer', cache=cache)
+        with self.assertNumQueries(0):
+            choices = utils.get_choices_from_distinct(BaseModelForTest, 'integer', cache=cache)
+        self.assertEqual(choices, [[15, 15]], "Distinct choices should be cached")
+
+    def test_backend(self):
+        caches['default'].clear()
+        cache = FormCache(backend='default')
+        cache.get_or_set('key', [RelatedModelForTest], lambda: 1)
+        shared = FormCache(backend='default')
+        self.assertEqual(shared.get_or_set('key', [RelatedModelForTest], lambda: 2), 1,
+                         "Entries should be shared through the backend")
+        cache.invalidate(RelatedModelForTest)
+        self.assertEqual(shared.get_or_set('key', [RelatedModelForTest], lambda: 3), 3,
+                         "Invalidation should reach every cache using the backend")
+
+    def test_stale_while_revalidate(self):
+        cache = FormCache(ttl=0, stale_ttl=60)
+        cache.get_or_set('key', [RelatedModelForTest], lambda: 1)
+        time.sleep(0.01)
+        self.assertEqual(cache.get_or_set('key', [RelatedModelForTest], lambda: 2), 1,
+                         "Stale value should be served while refreshing")
+        for thread in list(cache._refreshing.values()):
+            thread.join()
+        cache.ttl = 60
+        self.assertEqual(cache.get_or_set('key', [RelatedModelForTest], lambda: 3), 2,
+                         "Refreshed value should be served")
+
+    def test_watch_before_build(self):
+        form_cache = FormCache()
+
+        class WatchedForm(ModelQueryForm):
+            model = BaseModelForTest
+            include = ['integer', 'foreign_related']
+            cache = form_cache
+
+        versions = form_cache.get_versions([BaseModelForTest, RelatedModelForTest])
+        RelatedModelForTest.objects.create(related_type=2)
+        self.assertNotEqual(form_cache.get_versions([BaseModelForTest, RelatedModelForTest]), versions,
+                            "Writes before the form is built should invalidate its cache")
+        del form_registry[WatchedForm.get_form_key()]
+
+    def test_process_cached(self):
+        ResultCachedTraverseForm.result_cache.clear()
+        form = ResultCachedTraverseForm({'integer_0': 10, 'integer_1': 20})
+        form.is_valid()
+        self.assertEqual(form.process_cached(), [self.base.pk], "Should be the matching pks")
+        with self.assertNumQueries(0):
+            self.assertEqual(form.process_cached(), [self.base.pk], "Repeated searches should not query")
+        self.assertEqual(form.process_cached(fields=['integer', 'text']), [(15, 'foo')],
+                         "Should be the projected values")
+        self.assertEqual(form.process_cached(BaseModelForTest.objects.filter(integer=1)), [],
+                         "The data_set should be part of the key")
+        self.assertEqual(form.process_cached(BaseModelForTest.objects.filter(text__in=['foo, bar'])), [])
+        self.assertEqual(form.process_cached(BaseModelForTest.objects.filter(text__in=['foo', 'bar'])),
+                         [self.base.pk], "data_sets that print the same SQL should have their own keys")
+
+        self.base.many_related.add(self.related)
+        with self.assertNumQueries(1):
+            form.process_cached()
+
+        BaseModelForTest.objects.create(integer=11,
+                                        integer_with_choices=2,
+                                        float=.11,
+                                        boolean=False,
+                                        null_boolean=True,
+                                        text="bar")
+        self.assertEqual(len(form.process_cached()), 2, "Saves should invalidate results")
+        self.assertRaises(ImproperlyConfigured, CachedTraverseForm({}).process_cached)
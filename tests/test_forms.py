@@ -9,19 +9,25 @@ Tests for `django-modelqueryform` forms module.
 """
 
 from collections import OrderedDict
-from django.core.exceptions import ImproperlyConfigured
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.db.models import F
 from django.db.models.query_utils import Q
 from django.forms.fields import MultipleChoiceField, Field, IntegerField
 from django.test import TestCase
 
 from modelqueryform import utils
-from modelqueryform.widgets import RangeField
+from modelqueryform.forms import ModelQueryForm, form_registry
+from modelqueryform.explain import QueryTooExpensive
+from modelqueryform.widgets import RangeField, AutocompleteField
 from tests.forms import FormTest, FormTestWithText, FormTestWithTextNamedMethod, \
     FormTestWithTextTypeMethod, PreferBuildNamedMethodForm, NoModelForm, \
     GoodTraverseForm, RelatedAsChoicesForm, \
     FormTestWithTextNamedMethodAndProcessor, \
-    FormTestWithTextTypeMethodAndProcessor
-from tests.models import RelatedModelForTest, InheritBaseModelForTest
+    FormTestWithTextTypeMethodAndProcessor, RelatedValuesChoicesForm, ExplainForm, \
+    ReverseTraverseForm, SemijoinTraverseForm, WidgetPolicyForm, TwoHopDisplayForm
+from tests.models import RelatedModelForTest, InheritBaseModelForTest, ProxyBaseModelForTest
 from .models import BaseModelForTest
 
 try:
@@ -129,6 +135,17 @@ class TestModelqueryformForms(TestCase):
         except TypeError:
             self.fail("process() raised TypeError unexpectedly")
 
+    def test_process_type_check_without_queries(self):
+        form = FormTest({'integer_0': 12, 'integer_1': 19})
+        form.is_valid()
+        with self.assertNumQueries(0):
+            form.process(BaseModelForTest.objects.annotate(double=F('integer') * 2))
+            form.process(InheritBaseModelForTest.objects.all())
+            form.process(ProxyBaseModelForTest.objects.all())
+        self.assertEqual(form.process(BaseModelForTest.objects).count(), 4,
+                         "Managers should be accepted")
+        self.assertRaises(TypeError, form.process, [])
+
     def test_process_not_implemented(self):
         form = FormTestWithTextTypeMethod({'text': 'Test Text'})
         form.is_valid()
@@ -300,8 +317,8 @@ class TestModelqueryformForms(TestCase):
                               Q,
                               "Returns Q object"
                               )
-        self.assertEquals(2, len(diff_val),
-                          "Range Field with min < max should give a 2 element Q object"
+        self.assertEquals(Q(integer__range=(12, 19)), diff_val,
+                          "Range Field with min < max should give a single __range Q object"
                           )
 
         with_allow_empty = self.setUpRangeFieldFilter('integer', {'integer_0': 12,
@@ -477,3 +494,428 @@ class TestModelqueryformForms(TestCase):
                          [[x, x] for x in distinct_call],
                          "Tuple key,values should be the same"
                          )
+
+    def test_field_specs_instance_include(self):
+        form = FormTest(defer_build=True)
+        form.include = ['integer']
+        form.build()
+        self.assertEqual(list(form.fields), ['integer'], "An instance include should get its own specs")
+        self.assertEqual(list(FormTest().fields), FormTest.include,
+                         "An instance include should not change the class specs")
+
+    def test_field_specs_compiled_once(self):
+        specs = FormTest()._get_field_specs()
+        self.assertIs(FormTest()._get_field_specs(), specs,
+                      "Field specs should be compiled once per form class")
+        self.assertIsNot(FormTestWithTextNamedMethodAndProcessor()._get_field_specs(),
+                         FormTestWithTextNamedMethod()._get_field_specs(),
+                         "Subclasses should not share compiled field specs")
+        self.assertEqual([spec.name for spec in specs],
+                         FormTest.include,
+                         "Every include should have a field spec")
+
+    def test_field_prototypes_are_copied(self):
+        form_a = FormTest()
+        form_b = FormTest()
+        self.assertIsNot(form_a.fields['boolean'], form_b.fields['boolean'],
+                         "Form instances should get their own copy of prototype fields")
+        self.assertEqual(form_a.fields['integer_with_choices'].choices,
+                         form_b.fields['integer_with_choices'].choices,
+                         "Copies should match the prototype")
+
+    def test_range_bounds_single_query(self):
+        with self.assertNumQueries(1):
+            traverse_form = GoodTraverseForm()
+        self.assertEqual(traverse_form.fields['integer'].widget.widgets[0].attrs,
+                         {'min': 11, 'max': 19},
+                         "Range bounds should come from the shared aggregate")
+
+    def test_get_range_bounds(self):
+        self.assertEqual(utils.get_range_bounds(BaseModelForTest, []), {},
+                         "No fields should not query")
+        self.assertEqual(utils.get_range_bounds(BaseModelForTest, ['integer', 'related_type__related_type']),
+                         {'integer': (11, 19), 'related_type__related_type': (None, None)},
+                         "Bounds should be (min, max) per field name")
+
+    def test_related_values_choices(self):
+        r1, r2, r3, r4 = RelatedModelForTest.objects.all()
+        with self.assertNumQueries(1):
+            choices = utils.get_choices_from_values(RelatedModelForTest, 'related_type', chunk_size=2)
+        self.assertEqual(choices,
+                         ((r1.pk, '1'), (r2.pk, '2'), (r3.pk, '6'), (r4.pk, '2')),
+                         "Choices should be (pk, label) tuples")
+
+        form = RelatedValuesChoicesForm()
+        self.assertEqual(form.fields['foreign_related'].choices, list(choices),
+                         "Fields in related_choice_labels should use the label")
+        self.assertIsInstance(form.fields['many_related'].choices, list,
+                              "Other relations should keep model instance labels")
+        self.assertIsInstance(form.fields['many_related'].choices[0][1], RelatedModelForTest,
+                              "Other relations should keep model instance labels")
+
+        form = RelatedValuesChoicesForm({'foreign_related': [r3.pk]})
+        self.assertTrue(form.is_valid(), "Lightweight choices should validate")
+        self.assertEqual(form.pretty_print_query(), OrderedDict([('foreign related', '6')]),
+                         "Lightweight labels should print")
+
+    def test_multiplechoice_field_filter_lookups(self):
+        self.assertEqual(utils.get_multiplechoice_field_filter('integer_with_choices', ['1', '3', '1']),
+                         Q(integer_with_choices__in=['1', '3']),
+                         "Several values should give one deduplicated __in lookup")
+        self.assertEqual(utils.get_multiplechoice_field_filter('integer_with_choices', ['1']),
+                         Q(integer_with_choices='1'),
+                         "A single value should be an exact lookup")
+        self.assertEqual(utils.get_multiplechoice_field_filter('null_boolean', ['None', 'True'], True),
+                         Q(null_boolean='True') | Q(null_boolean__isnull=True),
+                         "None should be an __isnull lookup")
+        self.assertEqual(utils.get_multiplechoice_field_filter('text', ['None']), Q(text='None'),
+                         "'None' should be a value for fields without a None choice")
+        self.assertIsNone(utils.get_multiplechoice_field_filter('null_boolean', []),
+                          "No values should return None")
+
+        form = FormTest({'null_boolean': ['None', 'True']})
+        form.is_valid()
+        self.assertQuerysetEqual(form.process(),
+                                 [repr(r) for r in BaseModelForTest.objects.exclude(null_boolean=False)],
+                                 ordered=False)
+
+    def test_flatten_q(self):
+        self.assertEqual(utils.flatten_q([Q(a=1) & Q(b=2), Q(b=2), Q(Q(c=3))]),
+                         Q(a=1, b=2, c=3),
+                         "Nested ANDs should be flattened and duplicates dropped")
+        self.assertEqual(utils.flatten_q([Q(a=1) | Q(b=2), ~Q(c=3)]),
+                         (Q(a=1) | Q(b=2)) & ~Q(c=3),
+                         "ORs and negations should be kept as children")
+
+    def test_explain_query(self):
+        form = ExplainForm({'integer_0': 12, 'integer_1': 19})
+        form.is_valid()
+        filtered_dataset = form.process()
+        self.assertEqual(form.query_plan.full_scans, [BaseModelForTest._meta.db_table],
+                         "The sqlite plan should report the full table scan")
+        self.assertEqual(filtered_dataset.count(), 4, "Allowed plans should not change the results")
+
+        form.allow_full_scans = False
+        self.assertRaises(QueryTooExpensive, form.process)
+
+        form.query_guard_action = 'downgrade'
+        self.assertEqual(form.process().count(), 0, "Downgraded queries should be empty by default")
+
+        form = ExplainForm({})
+        form.is_valid()
+        form.process(BaseModelForTest.objects.filter(pk=1))
+        self.assertEqual(form.query_plan.full_scans, [], "pk lookups should not be full scans")
+
+        form.allow_full_scans = False
+        with self.assertNumQueries(0):
+            self.assertEqual(form.process(BaseModelForTest.objects.none()).count(), 0)
+        self.assertEqual((form.query_plan.cost, form.query_plan.full_scans), (0, []),
+                         "Empty QuerySets should get an empty plan")
+        form.process(BaseModelForTest.objects.filter(pk__in=[]))
+        self.assertEqual(form.query_plan.cost, 0)
+
+    def test_facet_counts(self):
+        form = FormTest({})
+        form.is_valid()
+        with self.assertNumQueries(1):
+            facets = form.facet_counts()
+        self.assertEqual(list(facets.keys()), ['integer_with_choices', 'boolean', 'null_boolean'],
+                         "Every choice field should have counts")
+        self.assertEqual(facets['integer_with_choices'], OrderedDict([(1, 1), (2, 3), (3, 1)]),
+                         "Counts should be per choice")
+        self.assertEqual(facets['null_boolean'], OrderedDict([(True, 1), (False, 1), (None, 3)]),
+                         "None should be counted with isnull")
+
+        form = FormTest({'boolean': [True], 'integer_with_choices': [2]})
+        form.is_valid()
+        facets = form.facet_counts(BaseModelForTest.objects)
+        self.assertEqual(facets['boolean'], OrderedDict([(True, 2), (False, 1)]),
+                         "A field's own selection should not filter its counts")
+        self.assertEqual(facets['integer_with_choices'], OrderedDict([(1, 1), (2, 2), (3, 1)]),
+                         "Other selections should filter the counts")
+
+        form.facet_chunk_size = 2
+        with self.assertNumQueries(4):
+            chunked = form.facet_counts()
+        self.assertEqual(chunked, facets, "Chunking should not change the counts")
+
+    def test_facet_counts_related(self):
+        r1 = RelatedModelForTest.objects.first()
+        for base in BaseModelForTest.objects.all()[:2]:
+            base.many_related.add(r1)
+        form = RelatedValuesChoicesForm({})
+        form.is_valid()
+        facets = form.facet_counts()
+        self.assertEqual(facets['many_related'][r1.pk], 2,
+                         "Relations should be counted once per row")
+
+    def test_batch_counts(self):
+        r1 = RelatedModelForTest.objects.first()
+        for base in BaseModelForTest.objects.all()[:2]:
+            base.many_related.add(r1)
+        forms = [FormTest({}),
+                 FormTest({'boolean': [True], 'integer_with_choices': [2]}),
+                 FormTest({'integer_with_choices': [9]}),
+                 GoodTraverseForm({'integer_0': 12, 'integer_1': 19}),
+                 RelatedValuesChoicesForm({'many_related': [r1.pk]})]
+        with self.assertNumQueries(1):
+            counts = FormTest.batch_counts(forms, BaseModelForTest.objects)
+        self.assertEqual(counts, [5, 2, None, 4, 2], "Invalid forms should not be counted")
+        self.assertEqual(counts, [form.process().count() if form.is_valid() else None for form in forms],
+                         "Counts should match process().count()")
+
+        with self.assertNumQueries(2):
+            chunked = FormTest.batch_counts(forms, chunk_size=2)
+        self.assertEqual(chunked, counts, "Chunking should not change the counts")
+
+        with self.assertRaises(TypeError):
+            FormTest.batch_counts(forms, RelatedModelForTest.objects.all())
+        forms[0].model = RelatedModelForTest
+        with self.assertRaises(TypeError):
+            FormTest.batch_counts(forms)
+
+    def test_defer_build(self):
+        with self.assertNumQueries(0):
+            form = GoodTraverseForm(defer_build=True)
+        self.assertEqual(len(form.fields), 0, "defer_build should skip building fields")
+        form.build()
+        self.assertEqual(len(form.fields), 5, "build() should build the fields")
+
+    def test_field_hooks_compiled_once(self):
+        form = FormTestWithTextTypeMethodAndProcessor({'text': "bar"})
+        form.is_valid()
+        form.process()
+        hooks = FormTestWithTextTypeMethodAndProcessor._field_hooks[(BaseModelForTest, 'text')]
+        self.assertEqual((hooks.filter, hooks.print_field, hooks.print_type),
+                         ('filter_type_textfield', None, 'print_type_textfield'),
+                         "Hooks should be found once per form class")
+        self.assertNotIn((BaseModelForTest, 'text'), FormTestWithTextTypeMethod._field_hooks,
+                         "Hook tables should not be shared with parent classes")
+
+        self.assertEqual(FormTest()._get_field_hooks('id').model_field.model, BaseModelForTest)
+        form = FormTest(defer_build=True)
+        form.model = RelatedModelForTest
+        self.assertEqual(form._get_field_hooks('id').model_field.model, RelatedModelForTest,
+                         "Instances with their own model should get their own hooks")
+
+    def test_filters_memoized(self):
+        form = FormTest({'integer_with_choices': [1, 3], 'integer_0': 12, 'integer_1': 19})
+        form.is_valid()
+        filters = form._get_named_filters()
+        query = form._get_query()
+        pretty_print = form.pretty_print_query()
+        self.assertIs(form._get_named_filters(), filters, "Filters should be memoized")
+        self.assertIs(form._get_query(), query, "The combined Q object should be memoized")
+        pretty_print['integer'] = 'changed'
+        self.assertNotEqual(form.pretty_print_query()['integer'], 'changed',
+                            "Memoized prints should not be changed through returned dicts")
+
+        form.full_clean()
+        self.assertIsNot(form._get_named_filters(), filters, "Validating again should reset the filters")
+        self.assertEqual(form._get_query(), query, "Validating again should give an equal Q object")
+
+    def test_compile_path(self):
+        hops = utils.compile_path(BaseModelForTest, 'many_related__related_type')
+        self.assertIs(utils.compile_path(BaseModelForTest, 'many_related__related_type'), hops,
+                      "Compiled paths should be cached")
+        self.assertEqual([(hop.model, hop.field.name, hop.is_to_many) for hop in hops],
+                         [(BaseModelForTest, 'many_related', True),
+                          (RelatedModelForTest, 'related_type', False)],
+                         "Every hop should have its model, field and whether it is to many")
+        self.assertTrue(utils.path_is_to_many(utils.compile_path(RelatedModelForTest, 'foreigns__integer')),
+                        "Reverse foreign keys are to many")
+        self.assertFalse(utils.path_is_to_many(GoodTraverseForm.get_path_hops('related_type__related_type')),
+                         "One to one relations are not to many")
+        self.assertRaises(FieldDoesNotExist, utils.compile_path, BaseModelForTest, 'integer__foo')
+
+    def test_invalid_include_path(self):
+        with self.assertRaises(ImproperlyConfigured):
+            class InvalidPathForm(ModelQueryForm):
+                model = BaseModelForTest
+                include = ['related_type__missing']
+        self.assertNotIn('tests.test_forms.InvalidPathForm', form_registry, "Invalid forms should not be registered")
+
+    def test_query_fingerprint(self):
+        form = FormTest({'integer_with_choices': [3, 1], 'integer_0': 12, 'integer_1': 19})
+        form.is_valid()
+        with self.assertNumQueries(0):
+            fingerprint = form.query_fingerprint()
+        self.assertEqual(len(fingerprint), 64, "Should be a sha256 hexdigest")
+
+        same = FormTest({'integer_with_choices': [1, 3, 1], 'integer_0': '12.0', 'integer_1': 19})
+        same.is_valid()
+        self.assertEqual(same.query_fingerprint(), fingerprint,
+                         "Value order, duplicates and numeric types should not change the fingerprint")
+
+        other = FormTest({'integer_with_choices': [1], 'integer_0': 12, 'integer_1': 19})
+        other.is_valid()
+        self.assertNotEqual(other.query_fingerprint(), fingerprint, "Other filters should change it")
+
+        other = PreferBuildNamedMethodForm({'integer_with_choices': [1, 3], 'integer_0': 12, 'integer_1': 19})
+        other.is_valid()
+        self.assertNotEqual(other.query_fingerprint(), fingerprint, "Other forms should change it")
+
+    def test_canonical_value(self):
+        self.assertEqual([utils.canonical_value(v) for v in [12, 12.0, Decimal('12.00'), 1.5, True, None]],
+                         ['12', '12', '12', '1.5', True, None],
+                         "Numbers should have one canonical form")
+        self.assertEqual(utils.canonical_value({'min': 1.0, 'max': [2, '1', 2]}),
+                         {'min': '1', 'max': ['1', '2']},
+                         "Containers should be normalized recursively")
+
+    def test_process_load_related(self):
+        related = list(RelatedModelForTest.objects.all())
+        for index, base in enumerate(BaseModelForTest.objects.filter(inheritbasemodelfortest__isnull=True)):
+            base.related_type = related[index]
+            base.foreign_related = related[0]
+            base.save()
+            base.many_related.add(related[1], related[2])
+
+        self.assertEqual(GoodTraverseForm().get_related_plan(),
+                         (['related_type', 'foreign_related'], ['many_related']),
+                         "Single valued hops should be joined and many valued ones prefetched")
+
+        form = GoodTraverseForm({})
+        form.is_valid()
+        with self.assertNumQueries(2):
+            rows = [(row.related_type, row.foreign_related, list(row.many_related.all()))
+                    for row in form.process(load_related=True)]
+        self.assertEqual(len(rows), 5, "Loading relations should not change the rows")
+
+        form = ReverseTraverseForm({})
+        form.is_valid()
+        with self.assertNumQueries(4):
+            rows = list(form.process(load_related=True))
+            for row in rows:
+                [base.integer for base in row.foreigns.all()]
+                [base.foreign_related for base in row.manys.all()]
+                row.ones
+        self.assertIn('text', rows[0].foreigns.all()[0].get_deferred_fields(),
+                      "Prefetched relations should only load the display_fields")
+
+        form = TwoHopDisplayForm({})
+        form.is_valid()
+        with self.assertNumQueries(3):
+            for row in form.process(load_related=True):
+                [base.foreign_related for base in row.manys.all()]
+
+    def test_semijoin_filter(self):
+        related = list(RelatedModelForTest.objects.all())
+        for base in BaseModelForTest.objects.all():
+            base.many_related.add(*related)
+
+        data = {'many_related__related_type_0': 2, 'many_related__related_type_1': 6}
+        form = GoodTraverseForm(data)
+        form.is_valid()
+        self.assertEqual(form.process().count(), 15, "Joined filters should repeat rows per matching relation")
+
+        form = SemijoinTraverseForm(data)
+        form.is_valid()
+        rows = form.process()
+        self.assertNotIn('JOIN', str(rows.query).split('WHERE')[0], "Semi-joins should not join the outer query")
+        self.assertEqual(rows.count(), 5, "Semi-joins should return every row once")
+
+        form = SemijoinTraverseForm({'many_related': [related[0].pk], 'integer_0': 10, 'integer_1': 20})
+        form.is_valid()
+        filters = form._get_named_filters()
+        self.assertEqual(filters['integer'], Q(integer__range=(10, 20)),
+                         "Paths without a many valued hop should not be semi-joined")
+        self.assertEqual(filters['many_related'], Q(many_related="%s" % related[0].pk),
+                         "to_many_filters should override to_many_filter")
+
+        form.to_many_filters = {'many_related': 'exists'}
+        form.full_clean()
+        with self.assertRaises(ImproperlyConfigured):
+            form.get_filters()
+
+    def test_export(self):
+        related = RelatedModelForTest.objects.get(related_type=6)
+        BaseModelForTest.objects.filter(integer=12).update(foreign_related=related)
+
+        form = GoodTraverseForm({'integer_0': 12, 'integer_1': 15})
+        form.is_valid()
+        with self.assertNumQueries(0):
+            lines = form.export(fields=['integer', 'foreign_related__related_type'])
+        lines = list(lines)
+        self.assertEqual(lines[0], "integer,foreign_related__related_type\r\n", "CSV should start with a header")
+        self.assertEqual(sorted(lines[1:]), ["12,6\r\n", "15,\r\n"], "Columns should follow include paths")
+
+        lines = list(form.export('jsonl', fields=['pk', 'float'], chunk_size=1))
+        self.assertEqual(len(lines), 2, "JSON Lines should not have a header")
+        self.assertIn('"float": 9.0', lines[0] + lines[1])
+
+        default = list(form.export(header=False))
+        self.assertEqual(default[0].count(','), len(GoodTraverseForm.include),
+                         "Columns should default to pk and include")
+
+        self.assertRaises(ValueError, form.export, 'xml')
+        self.assertRaises(ValueError, form.export, 'csv', ['missing'])
+
+    def test_query_codec(self):
+        data = {'integer_0': 12, 'integer_1': 19,
+                'integer_with_choices': ['3', '1'],
+                'null_boolean': ['None', 'True']}
+        form = FormTest(dict(('search-%s' % key, value) for key, value in data.items()), prefix='search')
+        form.is_valid()
+        query = form.encode_query()
+        self.assertTrue(query.startswith("1."), "Queries should start with their version")
+
+        decoded = FormTest.from_query(query, prefix='search')
+        self.assertTrue(decoded.is_bound)
+        self.assertTrue(decoded.is_valid(), decoded.errors)
+        self.assertEqual(decoded.query_fingerprint(), form.query_fingerprint(),
+                         "Decoded forms should have the same filters")
+        self.assertEqual(decoded.encode_query(), query)
+
+        empty = FormTest({})
+        empty.is_valid()
+        self.assertEqual(FormTest.from_query(empty.encode_query()).data, {})
+
+        for bad in ['', 'garbage', '2.' + query[2:], '1.!!!', query.replace('1.', '1.e30')]:
+            self.assertRaises(ValueError, FormTest.from_query, bad)
+        self.assertRaises(ValueError, GoodTraverseForm.from_query, query)
+
+    def test_widget_policy(self):
+        WidgetPolicyForm.cache.clear()
+        self.assertEqual(utils.estimate_cardinality(BaseModelForTest, 'integer', 2), 3,
+                         "Estimates should stop at limit + 1")
+        self.assertEqual(utils.estimate_cardinality(BaseModelForTest, 'foreign_related', 10), 4,
+                         "Relations should count the related rows")
+
+        form = WidgetPolicyForm({'foreign_related__related_type': ['None']})
+        self.assertIs(type(form.fields['integer']), RangeField, "Many distinct values should get a range")
+        self.assertIs(type(form.fields['integer_with_choices']), MultipleChoiceField)
+        self.assertIs(type(form.fields['foreign_related']), AutocompleteField,
+                      "Relations with many rows should get an autocomplete field")
+        self.assertEqual(form.fields['foreign_related__related_type'].choices, [[None, None]],
+                         "Few distinct values should get checkboxes")
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.process().count(), 5)
+
+        WidgetPolicyForm()
+        with self.assertNumQueries(0):
+            form = WidgetPolicyForm()
+        self.assertIs(type(form.fields['foreign_related']), AutocompleteField,
+                      "Estimates should be read from the cache")
+
+        RelatedModelForTest.objects.last().delete()
+        form = WidgetPolicyForm()
+        self.assertEqual(len(form.fields['foreign_related'].choices), 3,
+                         "Invalidated estimates should pick the widget again")
+
+        form = WidgetPolicyForm({'integer': ['15'],
+                                 'foreign_related__related_type_0': 1, 'foreign_related__related_type_1': 2,
+                                 'foreign_related__related_type_2': 'on'})
+        self.assertIs(type(form.fields['integer']), MultipleChoiceField,
+                      "Submitted checkboxes should be kept whatever the estimate")
+        self.assertIs(type(form.fields['foreign_related__related_type']), RangeField,
+                      "Submitted ranges should be kept whatever the estimate")
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.process().count(), 1)
+
+        with self.assertRaises(ImproperlyConfigured):
+            class UncachedPolicyForm(ModelQueryForm):
+                model = BaseModelForTest
+                include = ['integer']
+                widget_policy = True
+        self.assertNotIn('tests.test_forms.UncachedPolicyForm', form_registry)
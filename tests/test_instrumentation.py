@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` instrumentation module.
+"""
+
+from django.test import TestCase
+
+from modelqueryform.instrumentation import Instrument, LoggingInstrument, StatsdInstrument, StatsdClient, Span
+from tests.forms import GoodTraverseForm, FormTest
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+class CollectingInstrument(Instrument):
+    def __init__(self):
+        self.spans = []
+
+    def record(self, sender, form, span):
+        self.spans.append(span)
+
+
+class FakeStatsd(object):
+    def __init__(self):
+        self.sent = []
+
+    def timing(self, name, milliseconds):
+        self.sent.append(('timing', name))
+
+    def incr(self, name, count=1):
+        self.sent.append(('incr', name, count))
+
+
+class TestModelqueryformInstrumentation(TestCase):
+    def setUp(self):
+        related = RelatedModelForTest.objects.create(related_type=1)
+        BaseModelForTest.objects.create(integer=15,
+                                        integer_with_choices=1,
+                                        float=12.6,
+                                        boolean=True,
+                                        null_boolean=None,
+                                        text="foo",
+                                        foreign_related=related)
+        self.instrument = CollectingInstrument().connect(GoodTraverseForm)
+        self.addCleanup(self.instrument.disconnect)
+
+    def test_spans(self):
+        form = GoodTraverseForm({'integer_0': 10, 'integer_1': 20})
+        form.is_valid()
+        with form.span('evaluate'):
+            list(form.process())
+
+        phases = [(span.phase, span.field) for span in self.instrument.spans]
+        self.assertEqual(phases[:3], [('range_bounds', None), ('build_field', 'integer'), ('build_field', 'float')],
+                         "Build phases should be sent as they finish")
+        self.assertIn(('build', None), phases)
+        self.assertIn(('filter', 'integer'), phases, "Filters should be attributed to their field")
+        for phase in ['clean', 'filters', 'process', 'evaluate']:
+            self.assertIn((phase, None), phases)
+
+        spans = dict(((span.phase, span.field), span) for span in self.instrument.spans)
+        self.assertEqual(spans[('range_bounds', None)].queries, 1, "Range bounds should be a single query")
+        self.assertEqual(spans[('build', None)].queries, 1)
+        self.assertEqual(spans[('evaluate', None)].queries, 1)
+        self.assertGreaterEqual(spans[('build', None)].duration, spans[('range_bounds', None)].duration,
+                                "Outer spans should include inner ones")
+
+    def test_sender(self):
+        FormTest({}).is_valid()
+        self.assertEqual(self.instrument.spans, [], "Instruments should only get the spans of their sender")
+
+        self.instrument.disconnect()
+        GoodTraverseForm({}).is_valid()
+        self.assertEqual(self.instrument.spans, [], "Disconnected instruments should not get spans")
+
+    def test_logging_instrument(self):
+        instrument = LoggingInstrument().connect(FormTest)
+        self.addCleanup(instrument.disconnect)
+        with self.assertLogs('modelqueryform', 'INFO') as logs:
+            FormTest({})
+        self.assertTrue(logs.output[0].startswith("INFO:modelqueryform:FormTest range_bounds "),
+                        "Spans should be logged with the form and phase")
+        self.assertIn("build_field integer ", logs.output[1], "Field spans should name the field")
+
+    def test_statsd_instrument(self):
+        client = FakeStatsd()
+        StatsdInstrument(client, prefix='search').record(FormTest, None, Span('filter', 'integer', 0.5, 2))
+        self.assertEqual(client.sent, [('timing', 'search.FormTest.filter.integer'),
+                                       ('incr', 'search.FormTest.filter.integer.queries', 2)])
+
+        client = StatsdClient()
+        client.sent = []
+        client._send = client.sent.append
+        client.timing('search.FormTest.clean', 0.25)
+        self.assertEqual(client.sent, ['search.FormTest.clean:0.250|ms'], "Sub millisecond timings should be kept")
+        client._socket.close()
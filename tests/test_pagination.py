@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` pagination module.
+"""
+
+import base64
+import json
+
+from django.db.models import F
+from django.test import TestCase
+
+from modelqueryform.pagination import KeysetPaginator, InvalidCursor
+from tests.forms import GoodTraverseForm
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+class TestModelqueryformPagination(TestCase):
+    def setUp(self):
+        related = [RelatedModelForTest.objects.create(related_type=value) for value in (3, 1, 2)]
+        for index in range(30):
+            BaseModelForTest.objects.create(integer=index % 7,
+                                            integer_with_choices=1,
+                                            float=index,
+                                            boolean=True,
+                                            null_boolean=[None, True, False][index % 3],
+                                            text="row %s" % index,
+                                            foreign_related=related[index % 3] if index % 5 else None)
+        self.form = GoodTraverseForm({'float_0': 2, 'float_1': 27})
+        self.form.is_valid()
+
+    def walk(self, paginator):
+        pages = [paginator.page()]
+        while pages[-1].has_next:
+            pages.append(paginator.page(pages[-1].next_cursor))
+        return pages
+
+    def test_forward_and_back(self):
+        paginator = KeysetPaginator(self.form, page_size=7, ordering=['-integer'])
+        expected = list(self.form.process().order_by('-integer', 'pk'))
+
+        with self.assertNumQueries(1):
+            paginator.page()
+        pages = self.walk(paginator)
+        self.assertEqual([row for page in pages for row in page], expected,
+                         "Pages should follow the ordering without gaps or repeats")
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 5])
+        self.assertFalse(pages[0].has_previous)
+        self.assertIsNone(pages[-1].next_cursor)
+
+        page = pages[-1]
+        backwards = [page.object_list]
+        while page.has_previous:
+            page = paginator.page(page.previous_cursor)
+            backwards.insert(0, page.object_list)
+        self.assertEqual(backwards, [page.object_list for page in pages], "Previous cursors should walk back")
+
+    def test_traversed_ordering(self):
+        paginator = KeysetPaginator(self.form, page_size=4, ordering=['foreign_related__related_type', '-float'])
+        expected = list(self.form.process().order_by('foreign_related__related_type', '-float', 'pk'))
+        self.assertEqual([row for page in self.walk(paginator) for row in page], expected,
+                         "Ordering should follow single valued relations")
+
+        paginator = KeysetPaginator(self.form, page_size=4, ordering=['foreign_related'])
+        self.assertEqual(paginator.ordering, ['foreign_related_id', 'pk'], "Relations should order by their raw value")
+        expected = list(self.form.process().order_by(F('foreign_related_id').asc(nulls_first=True), 'pk'))
+        self.assertEqual([row for page in self.walk(paginator) for row in page], expected)
+
+        with self.assertRaises(ValueError):
+            KeysetPaginator(self.form, ordering=['related_type__ones'])
+        with self.assertRaises(ValueError):
+            KeysetPaginator(self.form, ordering=['many_related__related_type'])
+        with self.assertRaises(ValueError):
+            KeysetPaginator(self.form, ordering=['missing'])
+
+    def test_null_ordering(self):
+        for ordering in (['null_boolean'], ['-null_boolean', '-foreign_related__related_type']):
+            paginator = KeysetPaginator(self.form, page_size=4, ordering=ordering)
+            expected = list(self.form.process().order_by(*paginator._order_by(False)))
+            self.assertEqual(expected[0].null_boolean, None if ordering[0] == 'null_boolean' else True,
+                             "NULL should sort as the smallest value")
+            pages = self.walk(paginator)
+            self.assertEqual([row for page in pages for row in page], expected,
+                             "NULL values should be paged without gaps or repeats")
+
+            page = pages[-1]
+            backwards = [page.object_list]
+            while page.has_previous:
+                page = paginator.page(page.previous_cursor)
+                backwards.insert(0, page.object_list)
+            self.assertEqual(backwards, [page.object_list for page in pages], "Previous cursors should walk back")
+
+    def test_invalid_cursor(self):
+        cursor = KeysetPaginator(self.form, page_size=5).page().next_cursor
+
+        other_form = GoodTraverseForm({'float_0': 3, 'float_1': 27})
+        other_form.is_valid()
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(other_form, page_size=5).page(cursor)
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(self.form, page_size=5, ordering=['-pk']).page(cursor)
+        with self.assertRaises(InvalidCursor):
+            KeysetPaginator(self.form, page_size=5).page('not a cursor')
+
+        paginator = KeysetPaginator(self.form, page_size=5)
+        for values in (7, "ab", None):
+            data = json.dumps([self.form.query_fingerprint(), paginator.ordering, 'next', values])
+            with self.assertRaises(InvalidCursor):
+                paginator.page(base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii'))
+
+        paginator = KeysetPaginator(self.form, page_size=5, ordering=['-integer'])
+        for values in ([{'a': 1}, 1], ['abc', 1], [1, [2]], [1, 'x']):
+            data = json.dumps([self.form.query_fingerprint(), paginator.ordering, 'next', values])
+            with self.assertRaises(InvalidCursor, msg="Values that don't fit the ordering fields should be rejected"):
+                paginator.page(base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii'))
+        data = json.dumps([self.form.query_fingerprint(), paginator.ordering, 'next', ['3', 4]])
+        self.assertEqual(len(paginator.page(base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii'))), 5)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` summary module.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from modelqueryform import utils
+from modelqueryform.models import FieldSummary
+from modelqueryform.summary import refresh_summaries, get_summary_bounds
+from tests.forms import SummaryTraverseForm
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+class TestModelqueryformSummary(TestCase):
+    def setUp(self):
+        self.related = [RelatedModelForTest.objects.create(related_type=value) for value in (4, 9)]
+        for integer, related in [(15, self.related[0]), (11, self.related[1]), (12, None)]:
+            BaseModelForTest.objects.create(integer=integer,
+                                            integer_with_choices=1,
+                                            float=integer / 2.0,
+                                            boolean=True,
+                                            null_boolean=None,
+                                            text="foo",
+                                            foreign_related=related)
+
+    def create(self, integer, related=None):
+        return BaseModelForTest.objects.create(integer=integer,
+                                               integer_with_choices=1,
+                                               float=0.5,
+                                               boolean=True,
+                                               null_boolean=None,
+                                               text="bar",
+                                               foreign_related=related)
+
+    def test_fallback(self):
+        live = utils.get_range_bounds(BaseModelForTest, ['integer'])
+        self.assertEqual(SummaryTraverseForm().get_range_bounds(['integer']), live,
+                         "Paths without a summary should be aggregated")
+        self.assertEqual(SummaryTraverseForm(defer_build=True).get_distinct_choices('integer'),
+                         utils.get_choices_from_distinct(BaseModelForTest, 'integer'))
+
+    def test_command(self):
+        output = StringIO()
+        call_command('refresh_summaries', stdout=output)
+        self.assertIn("tests.forms.SummaryTraverseForm: 5 summaries refreshed", output.getvalue(),
+                      "Forms with use_summaries should be discovered")
+
+        with self.assertNumQueries(1):
+            form = SummaryTraverseForm()
+        self.assertEqual(form.fields['integer'].widget.widgets[0].attrs, {'min': 11, 'max': 15},
+                         "Bounds should be read from the summary table")
+        self.assertEqual(form.fields['foreign_related__related_type'].widget.widgets[1].attrs['max'], 9)
+        with self.assertNumQueries(1):
+            self.assertEqual(form.get_distinct_choices('foreign_related__related_type'),
+                             [[None, None], [4, 4], [9, 9]])
+
+        BaseModelForTest.objects.filter(integer=15).update(integer=20)
+        call_command('refresh_summaries', 'tests.forms.SummaryTraverseForm', stdout=output)
+        self.assertEqual(SummaryTraverseForm().get_range_bounds(['integer']), {'integer': (11, 20)},
+                         "Full refreshes should pick up updates")
+
+    def test_incremental(self):
+        refresh_summaries(BaseModelForTest, ['integer', 'float'], ['integer'])
+        self.create(30)
+        self.create(1, self.related[0])
+
+        with self.assertNumQueries(8):
+            refresh_summaries(BaseModelForTest, ['integer', 'float'], ['integer'], incremental=True)
+        self.assertEqual(get_summary_bounds(BaseModelForTest, ['integer', 'float']),
+                         {'integer': (1, 30), 'float': (0.5, 7.5)},
+                         "Incremental refreshes should widen the bounds")
+        self.assertEqual(SummaryTraverseForm(defer_build=True).get_distinct_choices('integer'),
+                         [[value, value] for value in [1, 11, 12, 15, 30]])
+
+        summary = FieldSummary.objects.get(model='tests.BaseModelForTest', path='integer')
+        self.assertEqual(summary.last_pk, "%s" % BaseModelForTest.objects.latest('pk').pk)
+        self.assertIsNone(FieldSummary.objects.get(path='float').distinct_values,
+                          "Only requested distinct values should be stored")
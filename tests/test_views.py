@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` views module.
+"""
+
+import json
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from modelqueryform import utils
+from modelqueryform.views import AutocompleteView, conditional_query_response
+from modelqueryform.widgets import AutocompleteField
+from tests.forms import AutocompleteForm, ResultCachedTraverseForm, WidgetPolicyForm, RestrictedAutocompleteForm
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+@override_settings(ROOT_URLCONF='tests.urls',
+                   SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+                   MIDDLEWARE=['django.contrib.sessions.middleware.SessionMiddleware',
+                               'django.contrib.auth.middleware.AuthenticationMiddleware'])
+class TestModelqueryformViews(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('searcher'))
+        self.related = [RelatedModelForTest.objects.create(related_type=value) for value in [1, 12, 6, 21, 2]]
+        base = BaseModelForTest.objects.create(integer=15,
+                                               integer_with_choices=1,
+                                               float=12.6,
+                                               boolean=True,
+                                               null_boolean=None,
+                                               text="foo",
+                                               foreign_related=self.related[1])
+        base.many_related.add(self.related[2])
+
+    def autocomplete_url(self, field):
+        return reverse('modelqueryform:autocomplete',
+                       kwargs={'form': AutocompleteForm.get_form_key(), 'field': field})
+
+    def test_autocomplete_form_build(self):
+        with self.assertNumQueries(0):
+            form = AutocompleteForm()
+        self.assertIsInstance(form.fields['foreign_related'], AutocompleteField,
+                              "autocomplete_fields should get an AutocompleteField")
+        self.assertEqual(list(form.fields['foreign_related'].choices), [],
+                         "No related rows should be loaded to build the form")
+        self.assertIn('data-autocomplete-url="%s"' % self.autocomplete_url('foreign_related'),
+                      str(form['foreign_related']),
+                      "Widget should point at the autocomplete view")
+
+    def test_autocomplete_form_process(self):
+        form = AutocompleteForm({'foreign_related': [self.related[1].pk], 'many_related': [self.related[2].pk]})
+        self.assertTrue(form.is_valid(), "Submitted pks should validate")
+        self.assertEqual(form.process().count(), 1, "Submitted pks should filter")
+        self.assertEqual(form.pretty_print_query(),
+                         OrderedDict([('foreign related', '12'), ('many related', str(self.related[2].pk))]),
+                         "Submitted pks should be labeled")
+
+        form = AutocompleteForm({'foreign_related': [0]})
+        self.assertFalse(form.is_valid(), "Unknown pks should not validate")
+        form = AutocompleteForm({'foreign_related': ['abc']})
+        self.assertFalse(form.is_valid(), "Invalid pks should not validate")
+
+    def test_autocomplete_view(self):
+        response = self.client.get(self.autocomplete_url('foreign_related'), {'q': '1'})
+        self.assertEqual(response.json(),
+                         {'results': [{'id': self.related[0].pk, 'text': '1'},
+                                      {'id': self.related[1].pk, 'text': '12'},
+                                      {'id': self.related[3].pk, 'text': '21'}],
+                          'next': None},
+                         "Search should match the label")
+
+        response = self.client.get(self.autocomplete_url('foreign_related'), {'after': self.related[3].pk})
+        self.assertEqual(response.json()['results'], [{'id': self.related[4].pk, 'text': '2'}],
+                         "after should return the following pks")
+        self.assertEqual(self.client.get(self.autocomplete_url('foreign_related'), {'after': 'x'}).status_code,
+                         400, "Invalid after should be a bad request")
+        self.assertEqual(self.client.get(self.autocomplete_url('integer')).status_code,
+                         404, "Only autocomplete_fields should be served")
+
+    def test_autocomplete_view_permission(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(self.autocomplete_url('foreign_related')).status_code, 403,
+                         "Anonymous requests should be denied")
+
+        request = RequestFactory().get(self.autocomplete_url('foreign_related'))
+        request.user = User.objects.get(username='searcher')
+
+        class OddView(AutocompleteView):
+            def get_queryset(self, request, form_class, field):
+                return super(OddView, self).get_queryset(request, form_class, field).filter(related_type__in=[1, 21])
+
+        response = OddView.as_view()(request, form=AutocompleteForm.get_form_key(), field='foreign_related')
+        self.assertEqual([result['text'] for result in json.loads(response.content.decode('utf-8'))['results']],
+                         ['1', '21'], "get_queryset should limit the choices")
+
+    def test_autocomplete_queryset(self):
+        url = reverse('modelqueryform:autocomplete',
+                      kwargs={'form': RestrictedAutocompleteForm.get_form_key(), 'field': 'foreign_related'})
+        self.assertEqual([result['text'] for result in self.client.get(url).json()['results']], ['1', '21'],
+                         "The view should page through the form's autocomplete queryset")
+
+        form = RestrictedAutocompleteForm({'foreign_related': [self.related[0].pk]})
+        self.assertTrue(form.is_valid())
+        form = RestrictedAutocompleteForm({'foreign_related': [self.related[1].pk]})
+        self.assertFalse(form.is_valid(), "pks the view doesn't offer should not validate")
+
+    def test_autocomplete_page(self):
+        choices, next_after = utils.get_autocomplete_page(RelatedModelForTest, 'related_type', page_size=2)
+        self.assertEqual(len(choices), 2, "Pages should have page_size choices")
+        self.assertEqual(next_after, self.related[1].pk, "next should be the last pk of the page")
+        choices, next_after = utils.get_autocomplete_page(RelatedModelForTest, 'related_type',
+                                                          after=next_after, page_size=2)
+        self.assertEqual([pk for pk, label in choices], [self.related[2].pk, self.related[3].pk],
+                         "after should continue where the last page ended")
+
+    def test_conditional_query_response(self):
+        query = ResultCachedTraverseForm.from_query(
+            self.client_form_query({'integer_0': 10, 'integer_1': 20})
+        )
+        responded = []
+
+        def respond(form):
+            responded.append(form)
+            return HttpResponse(",".join("%s" % pk for pk in form.process_cached()))
+
+        factory = RequestFactory()
+        response = conditional_query_response(factory.get('/'), query, respond)
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(responded), 1)
+
+        form = ResultCachedTraverseForm.from_query(query.encode_query())
+        response = conditional_query_response(factory.get('/', HTTP_IF_NONE_MATCH=etag), form, respond)
+        self.assertEqual(response.status_code, 304, "Repeat searches should not be modified")
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(responded), 1, "304s should not build the response")
+
+        base = BaseModelForTest.objects.get()
+        base.integer = 11
+        base.save()
+        form = ResultCachedTraverseForm.from_query(query.encode_query())
+        response = conditional_query_response(factory.get('/', HTTP_IF_NONE_MATCH=etag), form, respond)
+        self.assertEqual(response.status_code, 200, "Writes should change the ETag")
+        self.assertNotEqual(response['ETag'], etag)
+
+    def client_form_query(self, data):
+        form = ResultCachedTraverseForm(data)
+        form.is_valid()
+        return form.encode_query()
+
+    def test_widget_policy_autocomplete(self):
+        WidgetPolicyForm.cache.clear()
+        url = reverse('modelqueryform:autocomplete',
+                      kwargs={'form': WidgetPolicyForm.get_form_key(), 'field': 'foreign_related'})
+        self.assertEqual(self.client.get(url).status_code, 200,
+                         "Fields made autocomplete by widget_policy should be served")
+        url = reverse('modelqueryform:autocomplete',
+                      kwargs={'form': WidgetPolicyForm.get_form_key(), 'field': 'integer'})
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        url = reverse('modelqueryform:autocomplete',
+                      kwargs={'form': WidgetPolicyForm.get_form_key(), 'field': 'foreign_related'})
+        RelatedModelForTest.objects.filter(pk__in=[related.pk for related in self.related[:2]]).delete()
+        self.assertEqual(self.client.get(url).status_code, 404,
+                         "The view should follow the policy when the data changes")
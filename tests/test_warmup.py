@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_django-modelqueryform
+------------
+
+Tests for `django-modelqueryform` warmup module.
+"""
+
+from io import StringIO
+
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from modelqueryform.forms import form_registry
+from modelqueryform.warmup import get_warm_up_forms, warm_up_forms
+from tests.forms import GoodTraverseForm, WarmUpForm, NoModelForm
+from tests.models import BaseModelForTest, RelatedModelForTest
+
+
+class TestModelqueryformWarmUp(TestCase):
+    def setUp(self):
+        WarmUpForm.cache.clear()
+        WarmUpForm._field_specs = None
+        related = RelatedModelForTest.objects.create(related_type=1)
+        BaseModelForTest.objects.create(integer=15,
+                                        integer_with_choices=1,
+                                        float=12.6,
+                                        boolean=True,
+                                        null_boolean=None,
+                                        text="foo",
+                                        foreign_related=related)
+
+    def test_registry(self):
+        self.assertIs(form_registry['tests.forms.GoodTraverseForm'], GoodTraverseForm,
+                      "Forms should be registered by module and name")
+        self.assertNotIn(NoModelForm.get_form_key(), form_registry, "Forms without a model are abstract")
+        self.assertEqual(get_warm_up_forms(), [WarmUpForm], "Only forms with warm_up should be warmed up")
+
+    def test_warm_up(self):
+        with self.assertLogs('modelqueryform', 'INFO') as logs:
+            warm_up_forms()
+        self.assertIn("Warmed up tests.forms.WarmUpForm", logs.output[0])
+        self.assertIsNotNone(WarmUpForm._field_specs, "Field specs should be compiled")
+        with self.assertNumQueries(0):
+            WarmUpForm()
+
+    def test_command(self):
+        output = StringIO()
+        call_command('warm_up_forms', 'tests.forms.WarmUpForm', stdout=output)
+        self.assertEqual(output.getvalue(), "tests.forms.WarmUpForm warmed up\n")
+
+        call_command('warm_up_forms', '--all', stdout=output)
+        self.assertIn("tests.forms.GoodTraverseForm warmed up", output.getvalue())
+
+
+class TestModelqueryformWarmUpBackground(TransactionTestCase):
+    def test_warm_up_background(self):
+        WarmUpForm.cache.clear()
+        WarmUpForm._field_specs = None
+        RelatedModelForTest.objects.create(related_type=1)
+        with self.assertLogs('modelqueryform', 'INFO') as logs:
+            thread = warm_up_forms([WarmUpForm], background=True)
+            thread.join()
+        self.assertIn("Warmed up tests.forms.WarmUpForm", logs.output[0], "The thread should warm up the form")
+        self.assertIsNotNone(WarmUpForm._field_specs)
+
+    def test_app_config(self):
+        WarmUpForm.cache.clear()
+        WarmUpForm._field_specs = None
+        RelatedModelForTest.objects.create(related_type=1)
+        config = apps.get_app_config('modelqueryform')
+        with override_settings(MODELQUERYFORM_WARM_UP=True):
+            self.assertRaises(ImproperlyConfigured, config.ready)
+        with override_settings(MODELQUERYFORM_WARM_UP='background'):
+            with self.assertNumQueries(0):
+                config.ready()
+            self.assertIsNone(WarmUpForm._field_specs, "Nothing should be warmed up while the app loads")
+            threads = [thread for receiver, thread in request_started.send(sender=self.__class__)
+                       if thread is not None]
+        self.assertEqual(len(threads), 1, "The first request should start the warm up thread")
+        threads[0].join()
+        self.assertIsNotNone(WarmUpForm._field_specs, "The thread should warm up")
+        with self.assertNumQueries(0):
+            WarmUpForm()
+        self.assertFalse(request_started.disconnect(dispatch_uid='modelqueryform-warm-up'),
+                         "Only the first request should warm up")
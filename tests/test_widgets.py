@@ -140,3 +140,9 @@ class TestModelqueryformWidgets(TestCase):
                              {"min": 12.2, "max": 19.65},
                              "Cast Floats"
                              )
+
+    def test_field_with_bounds(self):
+        with self.assertNumQueries(0):
+            field = RangeField(BaseModelForTest, 'integer', bounds=(1, 5))
+        self.assertEqual(field.widget.widgets[0].attrs, {'min': 1, 'max': 5},
+                         "Precomputed bounds should be used as widget attrs")